@@ -0,0 +1,117 @@
+"""Times the slow parts of MessengerConversation against the way they used to
+be done. Point it at a conversation folder:
+
+    python benchmark.py assets/messages/inbox/MyChat_abc123abc123
+"""
+import sys
+import time
+
+# Our imports
+from messenger import MessengerConversation, forbidden, convert_unicode, convert_unicode_batch, tokenize_batch
+from messenger import emoji_matcher
+import messenger_ingest
+
+
+def legacy_clean_content(raw_content):
+    """How Message.Content used to make its text and word list, one message at
+    a time.
+    """
+    converted = convert_unicode(raw_content)
+    clean = converted.replace("\n", " ").lower()
+    for forbidden_character in forbidden:
+        clean = clean.replace(forbidden_character, "")
+    return converted, [word for word in clean.split() if word != ""]
+
+
+def timed(function, *args):
+    """Returns (result, seconds taken)
+    """
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+
+def report(name, messages, legacy_seconds, new_seconds):
+    print("{}: {:,.0f} messages/sec before, {:,.0f} messages/sec now ({:.1f}x)".format(
+        name,
+        messages / legacy_seconds,
+        messages / new_seconds,
+        legacy_seconds / new_seconds))
+
+
+def benchmark_text(convo):
+    """Text conversion and tokenizing. Compares one message at a time against
+    the whole conversation in one batch. Both must give the same output.
+    """
+    raw_texts = [message.get_raw_text() for message in convo if message.content is not None]
+
+    def legacy():
+        return [legacy_clean_content(raw_text) for raw_text in raw_texts]
+
+    def batch():
+        texts = convert_unicode_batch(raw_texts)
+        return list(zip(texts, tokenize_batch(texts)))
+
+    legacy_result, legacy_seconds = timed(legacy)
+    batch_result, batch_seconds = timed(batch)
+    assert legacy_result == batch_result, "The batch output is different"
+    report("Text conversion and tokenizing", len(raw_texts), legacy_seconds, batch_seconds)
+
+
+def benchmark_repair(filenames):
+    """Parsing with every field converted on its own against repairing the
+    whole file at once. Both must give the same messages. Media uris aren't
+    compared since only the repair fixes them. The repair isn't a speedup,
+    it comes out at about 0.9x, it is here to check it gives the same output.
+    """
+    def parse(repair_encoding):
+        return [MessengerConversation(f, repair_encoding=repair_encoding) for f in filenames]
+
+    def summary(conversations):
+        return [(c.title, c.participants,
+                 [(m.sender, m.timestamp_ms, m.get_text(),
+                   [(r.emoji, r.reactor) for r in m.reactions], len(m.photos))
+                  for m in c.messages])
+                for c in conversations]
+
+    per_field, per_field_seconds = timed(parse, False)
+    repaired, repaired_seconds = timed(parse, True)
+    assert summary(per_field) == summary(repaired), "The repaired output is different"
+    messages = sum(len(c.messages) for c in per_field)
+    report("Unicode repair (not a speedup)", messages, per_field_seconds, repaired_seconds)
+
+
+def benchmark_emojis(convo, limit=2000):
+    """Emoji counting. Compares calling str.count for every emoji against one
+    pass of the emoji matcher. Only the first limit messages with emojis are
+    used because the old way takes a long time.
+    """
+    matcher = emoji_matcher()
+    texts = [message.get_text() for message in convo if not message.get_text().isascii()][:limit]
+
+    def legacy():
+        return [sum(text.count(e) for text in texts) for e in matcher.patterns]
+
+    def matched():
+        counts = [0] * len(matcher.patterns)
+        for text in texts:
+            matcher.count(text, counts)
+        return counts
+
+    legacy_result, legacy_seconds = timed(legacy)
+    matched_result, matched_seconds = timed(matched)
+    assert legacy_result == matched_result, "The emoji counts are different"
+    report("Emoji counting", len(texts), legacy_seconds, matched_seconds)
+
+
+def main():
+    folder = sys.argv[1] if len(sys.argv) > 1 else "assets/messages/inbox/testchat_123abc"
+    convo = messenger_ingest.load_conversation(folder)
+    print(convo)
+    benchmark_text(convo)
+    benchmark_repair(messenger_ingest.find_message_files(folder))
+    benchmark_emojis(convo)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,17 @@
 import json
+import codecs
 import datetime
+import calendar
+import hashlib
+import bisect
+import inspect
 from collections import Counter
-from collections import deque
+from collections import OrderedDict
+from functools import partial, wraps
+import numpy as np
+import pandas as pd
+from dateutil import tz
 import emoji
-import threading
 import time
 
 # These characters are trimmed to make word counts.
@@ -17,100 +25,625 @@ convert = {
     "â\x80\x9d": '"'
 }
 
+# The convert table for use inside json text, where a '"' has to be escaped
+convert_json = {key: json.encoder.encode_basestring(item)[1:-1] for key, item in convert.items()}
+
+# Used to delete the forbidden characters and turn new lines into spaces in one
+# pass. This is done on the utf-8 bytes because bytes.translate is much faster
+# than str.translate, and ascii bytes never appear inside other characters.
+clean_table = bytes.maketrans(b"\n", b" ")
+forbidden_bytes = forbidden.encode("utf-8")
+
+# Goes between the texts of different messages when they are processed together.
+# It isn't a letter, so it doesn't change how the text around it is lower cased.
+batch_separator = "\x00"
+
+
 def convert_unicode(string):
     for key, item in convert.items():
         string = string.replace(key, item)
     return string.encode('raw_unicode_escape').decode('utf-8')
 
 
+class EncodingRepairError(ValueError):
+    """Raised when the raw json can't be repaired with repair_json_text
+    """
+
+
+def repair_json_text(text):
+    """Facebook writes every byte of a utf-8 character as its own \\u00XX
+    escape, so the strings come out of json.loads garbled. convert_unicode
+    fixes one string at a time. This fixes the whole raw file at once instead:
+    the escapes are turned into the bytes they stand for and the text is
+    decoded as utf-8. For the names, reactions, titles and message text the
+    result is identical to calling convert_unicode on them. The other strings,
+    like uris, are repaired too.
+    
+    Only plain ascii json with nothing but \\u00XX escapes can be repaired this
+    way. Anything else could give a different result to convert_unicode, so
+    None is returned and the fields have to be converted one at a time.
+
+    Args:
+        text (str or bytes): Raw json. It can be part of a file, as long as it
+            isn't cut inside a string.
+
+    Returns:
+        str: The repaired json, or None. Load it with strict=False because
+            it can contain control characters that used to be escaped.
+    """
+    if isinstance(text, str):
+        if not text.isascii():
+            return None
+        text = text.encode("ascii")
+    elif not text.isascii():
+        return None
+
+    # An escaped quote or backslash would end up breaking the json
+    if text.count(b"\\u") != text.count(b"\\u00") or b"\\u0022" in text or \
+            b"\\u005c" in text or b"\\u005C" in text:
+        return None
+
+    try:
+        # Only decodes the \\uXXXX escapes. The others are left alone.
+        text = text.decode("raw_unicode_escape")
+        for key, item in convert_json.items():
+            text = text.replace(key, item)
+        return text.encode("latin-1").decode("utf-8")
+    except UnicodeError:
+        return None
+
+
+def repair_json(data):
+    """Decodes a raw json file, repaired with repair_json_text.
+
+    Args:
+        data (bytes): The raw json file
+
+    Returns:
+        dict: The decoded and repaired json, or None if it can't be repaired
+    """
+    text = repair_json_text(data)
+    if text is None:
+        return None
+    return json.loads(text, strict=False)
+
+
+def _unchanged(string):
+    return string
+
+
+def clean_text(text):
+    """Lower cases the text and trims the forbidden characters. The word list
+    of a message is this split on whitespace.
+    """
+    clean = text.lower().encode("utf-8", "surrogatepass")
+    clean = clean.translate(clean_table, forbidden_bytes)
+    return clean.decode("utf-8", "surrogatepass")
+
+
+def _join_batch(strings):
+    """Joins the strings with the batch_separator. Returns None if one of the
+    strings already contains it, because then the result can't be split back up.
+    """
+    joined = batch_separator.join(strings)
+    if joined.count(batch_separator) != len(strings) - 1:
+        return None
+    return joined
+
+
+def convert_unicode_batch(strings):
+    """Same as calling convert_unicode on every string, but all the strings
+    are converted together in one pass.
+
+    Args:
+        strings (list(str)): The strings to convert
+
+    Returns:
+        list(str): The converted strings, in the same order
+    """
+    if len(strings) == 0:
+        return []
+    joined = _join_batch(strings)
+    if joined is None:
+        return [convert_unicode(string) for string in strings]
+    return convert_unicode(joined).split(batch_separator)
+
+
+def tokenize_batch(texts):
+    """Returns the word list of every text. Same as calling clean_text(text).split()
+    on every text, but all the texts are lower cased and cleaned in one pass.
+
+    Args:
+        texts (list(str)): Converted message texts
+
+    Returns:
+        list(list(str)): The words in each text
+    """
+    if len(texts) == 0:
+        return []
+    joined = _join_batch(texts)
+    if joined is None:
+        return [clean_text(text).split() for text in texts]
+    return [text.split() for text in clean_text(joined).split(batch_separator)]
+
+
+# The timezone the messages are shown and grouped in. None is the timezone of
+# the computer running this. Change it with set_timezone().
+timezone = None
+timezone_name = None
+
+
+def set_timezone(name):
+    """Sets the timezone used for message times, the date and hour columns and
+    the date ranges. The computer showing the dashboard isn't always in the same
+    timezone as the people in the chat. Conversations that are already loaded
+    rebuild their columns the next time they are used.
+
+    Args:
+        name (str): An IANA timezone name. Eg, "Australia/Sydney" or "UTC".
+            None goes back to the timezone of this computer.
+    """
+    global timezone, timezone_name
+    if name is None:
+        timezone = timezone_name = None
+        return
+    found = tz.gettz(name)
+    if found is None:
+        raise ValueError("Unknown timezone: {}".format(name))
+    timezone = found
+    timezone_name = name
+
+
 def convert_timestamp(timestamp):
-    return datetime.datetime.fromtimestamp(timestamp)
+    """Turns seconds since the epoch into a datetime in the chosen timezone.
+    The datetime is naive so it can be compared with the dates from the
+    dashboard.
+    """
+    if timezone is None:
+        return datetime.datetime.fromtimestamp(timestamp)
+    return datetime.datetime.fromtimestamp(timestamp, timezone).replace(tzinfo=None)
+
+
+def to_timestamp(when):
+    """The opposite of convert_timestamp. Naive datetimes are taken to be in
+    the chosen timezone.
+
+    Returns:
+        float: Seconds since the epoch
+    """
+    if when.tzinfo is None and timezone is not None:
+        when = when.replace(tzinfo=timezone)
+    return when.timestamp()
+
+
+class EmojiMatcher:
+    """Counts many patterns in a text in one pass with an Aho-Corasick
+    automaton, instead of calling str.count once for every pattern. Each
+    pattern is counted the same way str.count would count it by itself: the
+    emojis inside longer emojis are counted too (the 👍 in 👍🏻), but a pattern
+    doesn't overlap with itself.
+    """
+    def __init__(self, patterns):
+        """
+        Args:
+            patterns (list(str)): The patterns to count. Eg, every emoji.
+        """
+        self.patterns = list(patterns)
+        self.lengths = [len(pattern) for pattern in self.patterns]
+
+        # A trie of the patterns. State 0 is the root.
+        self.goto = [{}]
+        self.output = [[]]
+        for pattern_id, pattern in enumerate(self.patterns):
+            state = 0
+            for character in pattern:
+                if character not in self.goto[state]:
+                    self.goto.append({})
+                    self.output.append([])
+                    self.goto[state][character] = len(self.goto) - 1
+                state = self.goto[state][character]
+            self.output[state].append(pattern_id)
+
+        # Where to go when a character doesn't continue the match: the state
+        # of the longest suffix of the match that is also in the trie. Done
+        # breadth first so the shorter states are finished first.
+        self.fail = [0] * len(self.goto)
+        queue = list(self.goto[0].values())
+        for state in queue:
+            for character, next_state in self.goto[state].items():
+                fallback = self.fail[state]
+                while fallback and character not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[next_state] = self.goto[fallback].get(character, 0)
+                self.output[next_state] = self.output[next_state] + self.output[self.fail[next_state]]
+                queue.append(next_state)
+
+    def count(self, text, counts):
+        """Adds the number of times each pattern is in text to counts.
+
+        Args:
+            text (str): The text to search
+            counts (list(int)): The count of each pattern, by pattern index
+        """
+        goto, fail, output, lengths = self.goto, self.fail, self.output, self.lengths
+        # Where the last counted match of each pattern ended
+        last_end = {}
+        state = 0
+        for end, character in enumerate(text, 1):
+            while state and character not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(character, 0)
+            for pattern_id in output[state]:
+                if end - lengths[pattern_id] >= last_end.get(pattern_id, 0):
+                    counts[pattern_id] += 1
+                    last_end[pattern_id] = end
+
+
+_emoji_matcher = None
+
+
+def emoji_matcher():
+    """Returns the EmojiMatcher for every emoji in the emoji package. It is
+    only built once.
+    """
+    global _emoji_matcher
+    if _emoji_matcher is None:
+        _emoji_matcher = EmojiMatcher(emoji.EMOJI_UNICODE.values())
+    return _emoji_matcher
+
+
+def count_emojis_by_sender(texts, sender_ids, sender_count):
+    """Counts the emojis in the texts for each sender. Texts without any
+    non-ascii characters can't have emojis, so they are skipped.
+
+    Args:
+        texts (iterable(str)): The message texts
+        sender_ids (iterable(int)): The sender id of each text
+        sender_count (int): The number of sender ids
+
+    Returns:
+        list(list(int)): The count of each emoji_matcher() pattern, for each
+            sender id
+    """
+    matcher = emoji_matcher()
+    counts = [[0] * len(matcher.patterns) for _ in range(sender_count)]
+    for text, sender_id in zip(texts, sender_ids):
+        if not text.isascii():
+            matcher.count(text, counts[sender_id])
+    return counts
+
+
+def count_ngrams(word_lists, n):
+    """Counts every run of n words in a row inside each word list. Runs don't
+    carry on from one message into the next.
+
+    Args:
+        word_lists (iterable(list(str))): The word list of each message
+        n (int): The number of words in a row. Eg, 2 counts pairs of words.
+
+    Returns:
+        Counter(tuple(str) : int): The count of each n-gram
+    """
+    assert n >= 1
+    counts = Counter()
+    for words in word_lists:
+        counts.update(zip(*(words[i:] for i in range(n))))
+    return counts
+
+
+class JsonStreamReader:
+    """Reads the top level object of a json file a piece at a time. One array
+    inside the object (the "messages" array for Messenger) can be streamed so
+    that its items are decoded one by one while the file is being read. Only a
+    chunk of the file and the item being decoded are ever held in memory.
+    """
+    def __init__(self, f, chunk_size=1 << 16, repair_encoding=False):
+        """
+        Args:
+            f (file): A file opened in "rb" mode
+            chunk_size (int, optional): Bytes to read at a time. Defaults to 64KiB.
+            repair_encoding (bool, optional): Run repair_json_text over each
+                chunk as it is read, so the strings come out already fixed. Raises EncodingRepairError if it can't be
+                repaired. Defaults to False.
+        """
+        self.f = f
+        self.chunk_size = chunk_size
+        self.repair_encoding = repair_encoding
+        self.unrepaired = ""
+        self.decoder = codecs.getincrementaldecoder("utf-8")()
+        self.json_decoder = json.JSONDecoder(strict=not repair_encoding)
+        self.buffer = ""
+        self.position = 0
+        self.eof = False
+
+    def _read(self):
+        """Reads the next chunk into the buffer. The part of the buffer that
+        has already been decoded is thrown away.
+        """
+        chunk = self.f.read(self.chunk_size)
+        self.eof = len(chunk) == 0
+        text = self.decoder.decode(chunk, final=self.eof)
+        if self.repair_encoding:
+            text = self._repair(text)
+        self.buffer = self.buffer[self.position:] + text
+        self.position = 0
+
+    def _repair(self, text):
+        """Repairs as much of the text as can be done safely. A chunk is only
+        repaired up to its last quote so a run of escapes is never split in
+        two. The rest is repaired with the next chunk.
+        """
+        text = self.unrepaired + text
+        cut = len(text) if self.eof else max(text.rfind('"'), 0)
+        self.unrepaired = text[cut:]
+        repaired = repair_json_text(text[:cut])
+        if repaired is None:
+            raise EncodingRepairError("The json can't be repaired as a whole")
+        return repaired
+
+    def _peek(self):
+        """Returns the next character that isn't whitespace without consuming
+        it.
+        """
+        while True:
+            while self.position < len(self.buffer) and self.buffer[self.position] in " \t\n\r":
+                self.position += 1
+            if self.position < len(self.buffer):
+                return self.buffer[self.position]
+            if self.eof:
+                raise ValueError("Unexpected end of json file")
+            self._read()
+
+    def _expect(self, characters):
+        """Consumes the next character that isn't whitespace. It must be one
+        of the expected characters.
+
+        Returns:
+            str: The character consumed
+        """
+        character = self._peek()
+        if character not in characters:
+            raise ValueError("Expected one of {} in json file but found {}".format(
+                characters, repr(character)))
+        self.position += 1
+        return character
+
+    def _value(self):
+        """Decodes the next json value. More of the file is read until the
+        value is complete. A value has to be followed by a delimiter before
+        it is trusted, because a number like 12 could really be the start of
+        12.5 that hasn't been read yet.
+        """
+        self._peek()
+        while True:
+            try:
+                value, end = self.json_decoder.raw_decode(self.buffer, self.position)
+                if self.eof or (end < len(self.buffer) and self.buffer[end] in " \t\n\r,:]}"):
+                    self.position = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self._read()
+
+    def items(self, stream_key):
+        """Yields (key, value) for each entry in the top level object. If the
+        value of stream_key is an array, (stream_key, item) is yielded for
+        every item in it instead of the array as a whole.
+
+        Args:
+            stream_key (str): The key of the array to stream. Eg, "messages"
+        """
+        self._expect("{")
+        if self._peek() == "}":
+            return
+
+        while True:
+            key = self._value()
+            self._expect(":")
+            if key == stream_key and self._peek() == "[":
+                self._expect("[")
+                if self._peek() == "]":
+                    self._expect("]")
+                else:
+                    while True:
+                        yield key, self._value()
+                        if self._expect(",]") == "]":
+                            break
+            else:
+                yield key, self._value()
+
+            if self._expect(",}") == "}":
+                return
 
 
 class Message:
+    """A single message. Message and the classes inside it use __slots__
+    because a big chat has millions of them, and a __dict__ for each one adds
+    up quickly.
+    """
+    __slots__ = ("sender", "timestamp_ms", "reactions", "gifs",
+                 "audio", "videos", "photos", "content")
+
     class Reactions:
-        def __init__(self, reaction_json):
-            self.emoji = convert_unicode(reaction_json["reaction"])
-            self.reactor = convert_unicode(reaction_json["actor"])
+        __slots__ = ("emoji", "reactor")
+
+        def __init__(self, reaction_json, fix=convert_unicode):
+            self.emoji = fix(reaction_json["reaction"])
+            self.reactor = fix(reaction_json["actor"])
             
     class Gif:
+        __slots__ = ("uri",)
+
         def __init__(self, gif_json):
             self.uri = gif_json["uri"]
             
     class Audio:
+        __slots__ = ("uri", "creation_timestamp")
+
         def __init__(self, audio_json):
             self.uri = audio_json["uri"]
-            self.time = convert_timestamp(audio_json["creation_timestamp"])
+            self.creation_timestamp = audio_json["creation_timestamp"]
+
+        @property
+        def time(self):
+            return convert_timestamp(self.creation_timestamp)
 
     class Video:
+        __slots__ = ("uri", "creation_timestamp", "thumbnail")
+
         def __init__(self, video_json):
             self.uri = video_json["uri"]
-            self.time = convert_timestamp(video_json["creation_timestamp"])
+            self.creation_timestamp = video_json["creation_timestamp"]
             self.thumbnail = video_json["thumbnail"]["uri"]
 
+        @property
+        def time(self):
+            return convert_timestamp(self.creation_timestamp)
+
     class Photo:
+        __slots__ = ("uri", "creation_timestamp")
+
         def __init__(self, photo_json):
             self.uri = photo_json["uri"]
-            self.time = convert_timestamp(photo_json["creation_timestamp"])
+            self.creation_timestamp = photo_json["creation_timestamp"]
+
+        @property
+        def time(self):
+            return convert_timestamp(self.creation_timestamp)
     
     class Content:
-        def __init__(self, content):
-            self.raw_text = content
-            self.text, clean = self._clean_content(content)
-            
-            self.word_list = [word for word in clean.split() if word != ""]
-            # for word in clean.split():
-            #     if word != "":
-            #         self.word_list.append(word)
-            self.word_count = Counter(self.word_list)
-        
-        def _clean_content(self, raw_content):
-            converted = convert_unicode(raw_content)
-            clean = converted.replace("\n", " ").lower()
-            for forbidden_character in forbidden:
-                clean = clean.replace(forbidden_character, "")
-            return converted, clean
-    
-    def __init__(self, json_data):
-        self.sender = convert_unicode(json_data["sender_name"])
-        self.time = convert_timestamp(json_data["timestamp_ms"] // 1000)
-
-        self.reactions = self._read_reactions(json_data)
+        """The text of a message. The text is converted from the raw text the
+        first time it is needed, unless a whole conversation was converted at
+        once with Content.normalize_all(). The word list and word count are
+        also only made the first time they are asked for, then kept.
+        """
+        __slots__ = ("_raw_text", "_text", "_word_list", "_word_count")
+
+        def __init__(self, content, repaired=False):
+            self._raw_text = content
+            self._text = None
+            self._word_list = None
+            self._word_count = None
+            if repaired:
+                self._set_text(content)
+
+        def _set_text(self, text):
+            # Most messages don't need converting, so the raw text is only
+            # kept when it is different.
+            if text == self._raw_text:
+                self._text = self._raw_text
+                self._raw_text = None
+            else:
+                self._text = text
+
+        @property
+        def text(self):
+            if self._text is None:
+                self._set_text(convert_unicode(self._raw_text))
+            return self._text
+
+        @property
+        def raw_text(self):
+            if self._raw_text is None:
+                return self._text
+            return self._raw_text
+
+        @property
+        def word_list(self):
+            if self._word_list is None:
+                self._word_list = clean_text(self.text).split()
+            return self._word_list
+
+        @property
+        def word_count(self):
+            if self._word_count is None:
+                self._word_count = Counter(self.word_list)
+            return self._word_count
+
+        @staticmethod
+        def normalize_all(contents):
+            """Converts the text of every content in one batch.
+            """
+            pending = [content for content in contents if content._text is None]
+            texts = convert_unicode_batch([content._raw_text for content in pending])
+            for content, text in zip(pending, texts):
+                content._set_text(text)
+
+        @staticmethod
+        def tokenize_all(contents):
+            """Makes the word list of every content in one batch.
+            """
+            pending = [content for content in contents if content._word_list is None]
+            word_lists = tokenize_batch([content.text for content in pending])
+            for content, word_list in zip(pending, word_lists):
+                content._word_list = word_list
+    
+    def __init__(self, json_data, repaired=False):
+        """
+        Args:
+            json_data (dict): The message from the json file
+            repaired (bool, optional): The strings were already fixed by
+                repair_json_text, so they don't need converting. Defaults to False.
+        """
+        self.sender = (_unchanged if repaired else convert_unicode)(json_data["sender_name"])
+        self.timestamp_ms = json_data["timestamp_ms"]
+
+        self.reactions = self._read_reactions(json_data, repaired)
         self.gifs = self._read_gifs(json_data)
         self.audio = self._read_audio(json_data)
         self.videos = self._read_videos(json_data)
         self.photos = self._read_photos(json_data)
-        self.content = self._read_content(json_data)
+        self.content = self._read_content(json_data, repaired)
 
-    def _read_reactions(self, json_data):
+    def key(self):
+        """Returns a key that is the same for the same message in two different
+        exports, so messages that were already loaded can be recognised. Made
+        from the sender, the time in milliseconds and a hash of the text.
+        """
+        text = self.get_text().encode("utf-8", "surrogatepass")
+        return (self.sender, self.timestamp_ms, hashlib.blake2b(text, digest_size=8).digest())
+
+    @property
+    def time(self):
+        """The time the message was sent in the chosen timezone. It is made from
+        timestamp_ms every time, so keep to the conversation's columns when
+        looking at many messages.
+        """
+        return convert_timestamp(self.timestamp_ms // 1000)
+
+    # A missing field is stored as the empty tuple. There is only one empty
+    # tuple, so this costs nothing per message unlike an empty list.
+    def _read_reactions(self, json_data, repaired):
         if "reactions" not in json_data:
-            return []
-        return [self.Reactions(data) for data in json_data["reactions"]]
+            return ()
+        fix = _unchanged if repaired else convert_unicode
+        return [self.Reactions(data, fix) for data in json_data["reactions"]]
     
     def _read_gifs(self, json_data):
         if "gifs" not in json_data:
-            return  []
+            return ()
         return [self.Gif(data) for data in json_data["gifs"]]
     
     def _read_audio(self, json_data):
         if "audio_files" not in json_data:
-            return []
+            return ()
         return [self.Audio(data) for data in json_data["audio_files"]]
     
     def _read_videos(self, json_data):
         if "videos" not in json_data:
-            return []
+            return ()
         return [self.Video(data) for data in json_data["videos"]]
     
     def _read_photos(self, json_data):
         if "photos" not in json_data:
-            return []
+            return ()
         return [self.Photo(data) for data in json_data["photos"]]
     
-    def _read_content(self, json_data):
+    def _read_content(self, json_data, repaired):
         if "content" not in json_data:
             return None
-        return self.Content(json_data["content"])
+        return self.Content(json_data["content"], repaired)
     
     def get_text(self):
         if self.content is not None:
@@ -118,13 +651,19 @@ class Message:
         return ""
 
     def get_raw_text(self):
+        """The text as it is in the export, before convert_unicode.
+
+        If the conversation was loaded with repair_encoding the export string
+        isn't kept, since the whole file is fixed before it is decoded, so
+        this is the repaired text and the same as get_text().
+        """
         if self.content is not None:
             return self.content.raw_text
         return ""
     
     def has_media(self):
-        return self.gifs != [] or self.audio != [] or \
-            self.videos != [] or self.photos != []
+        return len(self.gifs) != 0 or len(self.audio) != 0 or \
+            len(self.videos) != 0 or len(self.photos) != 0
     
     def __repr__(self):
         max_line_length = 100
@@ -133,14 +672,7 @@ class Message:
         return "{}: {}: {}".format(self.time, self.sender, show_text)
 
     def __iter__(self):
-        self.i = -1
-        return self
-
-    def __next__(self):
-        self.i += 1
-        if self.i == len(self):
-            raise StopIteration
-        return self.get_text()[self.i]
+        return iter(self.get_text())
 
     def __getitem__(self, key):
         return self.get_text()[key]
@@ -209,8 +741,573 @@ class Message:
         return self.content.word_list
 
 
+class ConversationColumns:
+    """The messages of a conversation stored as NumPy arrays, one array per
+    field. Row i of every array belongs to the i-th message of the
+    conversation. Aggregating over these arrays is much faster than looping over
+    the Message objects one attribute at a time.
+
+    Columns:
+        timestamps (int64): Milliseconds since the epoch. Sorted, because the
+            messages are.
+        seconds (int64): Whole seconds since the epoch, what message.time is
+            made from. Also sorted.
+        sender_ids (int32): Index of the sender in senders
+        has_content (bool): The message has text
+        has_media (bool): The message has gifs, audio, videos or photos
+        year, month, day, hour, minute, second (int16): Parts of message.time
+        weekday (int8): Monday is 0 and Sunday is 6
+        days (int32): The proleptic Gregorian ordinal of the date of message.time
+
+    The date and time columns are worked out from the timestamps all at once in
+    the timezone that was chosen when the columns were made.
+    """
+    def __init__(self, messages, participants):
+        """
+        Args:
+            messages (list(Message)): The messages in the conversation
+            participants (list(str)): The people in the conversation. Used as
+                the order of the sender ids.
+        """
+        self.senders = list(participants)
+        for message in messages:
+            if message.sender not in self.senders:
+                self.senders.append(message.sender)
+        self._sender_index = {person: i for i, person in enumerate(self.senders)}
+
+        count = len(messages)
+        self.timestamps = np.fromiter((m.timestamp_ms for m in messages), np.int64, count)
+        self.sender_ids = np.fromiter((self._sender_index[m.sender] for m in messages), np.int32, count)
+        self.has_content = np.fromiter((m.content is not None for m in messages), bool, count)
+        self.has_media = np.fromiter((m.has_media() for m in messages), bool, count)
+
+        self.timezone = timezone
+        # Whole seconds, like message.time. The wall clock times are worked out
+        # once, then every column is read from them without any timezone maths.
+        # gettz() reads the local timezone from its file when it can, which
+        # pandas converts much faster than tzlocal().
+        times = pd.DatetimeIndex(pd.to_datetime(self.timestamps // 1000, unit="s", utc=True))
+        times = times.tz_convert(tz.gettz() if timezone is None else timezone).tz_localize(None)
+        self.year = times.year.values.astype(np.int16)
+        self.month = times.month.values.astype(np.int16)
+        self.day = times.day.values.astype(np.int16)
+        self.hour = times.hour.values.astype(np.int16)
+        self.minute = times.minute.values.astype(np.int16)
+        self.second = times.second.values.astype(np.int16)
+        self.weekday = times.weekday.values.astype(np.int8)
+        # Days since 1970-01-01 of the local date, shifted to ordinals
+        local_days = times.values.astype("datetime64[D]").astype(np.int64)
+        self.days = (local_days + datetime.date(1970, 1, 1).toordinal()).astype(np.int32)
+        self.seconds = self.timestamps // 1000
+
+        # The dates only go backwards if a clock change crosses midnight, which
+        # a few timezones have done.
+        self.days_sorted = bool((self.days[1:] >= self.days[:-1]).all())
+
+    # The columns with one row per message
+    row_columns = ("timestamps", "seconds", "sender_ids", "has_content", "has_media", "year",
+                   "month", "day", "hour", "minute", "second", "weekday", "days")
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def take(self, positions, participants):
+        """Returns the columns of the messages at positions, without going
+        back to the Message objects. Each column is only cut out the first
+        time it is used, and a slice gives NumPy views of these columns, so
+        nothing is copied.
+
+        Args:
+            positions (slice or numpy.ndarray): Message positions, in order
+            participants (list(str)): The people of the new columns. Used as
+                the order of the sender ids, like in __init__.
+        """
+        taken = ConversationColumns.__new__(ConversationColumns)
+        taken._source = self
+        taken._positions = positions
+        taken.timezone = self.timezone
+        # Picking some of the sorted dates leaves them sorted
+        taken.days_sorted = self.days_sorted
+
+        # The senders that aren't participants go after them, in the order
+        # they first sent a message, like __init__ does.
+        sender_ids = self.sender_ids[positions]
+        senders = list(participants)
+        found, first_positions = np.unique(sender_ids, return_index=True)
+        for sender_id in found[np.argsort(first_positions)].tolist():
+            if self.senders[sender_id] not in senders:
+                senders.append(self.senders[sender_id])
+        taken.senders = senders
+        taken._sender_index = {person: i for i, person in enumerate(senders)}
+        if senders != self.senders:
+            new_ids = np.array([taken._sender_index.get(person, -1) for person in self.senders], np.int32)
+            sender_ids = new_ids[sender_ids]
+        taken.sender_ids = sender_ids
+        return taken
+
+    def __getattr__(self, name):
+        # Only called for the columns take() hasn't cut out yet
+        if name in ConversationColumns.row_columns and "_source" in self.__dict__:
+            column = getattr(self._source, name)[self._positions]
+            setattr(self, name, column)
+            return column
+        raise AttributeError(name)
+
+    def sender_id(self, person):
+        """Returns the sender id of a person, or -1 if they never sent a
+        message.
+        """
+        return self._sender_index.get(person, -1)
+
+    def sender_mask(self, person):
+        """Returns a boolean array that is True for the messages sent by person
+        """
+        return self.sender_ids == self.sender_id(person)
+
+    def count_by_sender(self, column):
+        """Counts the messages of every sender for every value in a column, in
+        one pass over the column however many senders there are.
+
+        Args:
+            column (numpy.ndarray): One of the columns, eg self.hour
+
+        Returns:
+            (numpy.ndarray, numpy.ndarray, numpy.ndarray): The values found,
+            sorted, a matrix with the number of messages of each sender id
+            (row) for each value (column), and a matrix of the same shape with
+            the position of the first of those messages (len(self) if there
+            are none)
+        """
+        values = np.unique(column)
+        value_ids = np.searchsorted(values, column)
+        cells = self.sender_ids.astype(np.int64) * len(values) + value_ids
+        shape = (len(self.senders), len(values))
+        counts = np.bincount(cells, minlength=shape[0] * shape[1])
+        first_seen = np.full(shape[0] * shape[1], len(column), dtype=np.int64)
+        found, first_positions = np.unique(cells, return_index=True)
+        first_seen[found] = first_positions
+        return values, counts.reshape(shape), first_seen.reshape(shape)
+
+    def time_slice(self, start=None, end=None, inclusive=True):
+        """Finds the messages sent between two times with two binary searches.
+
+        Args:
+            start (float, optional): Seconds since the epoch. Defaults to no limit.
+            end (float, optional): Seconds since the epoch. Defaults to no limit.
+            inclusive (bool, optional): Include the messages sent at end.
+                Defaults to True.
+
+        Returns:
+            slice: The positions of the messages
+        """
+        low = 0 if start is None else int(np.searchsorted(self.seconds, np.ceil(start), side="left"))
+        if end is None:
+            high = len(self.seconds)
+        else:
+            high = int(np.searchsorted(self.seconds, np.floor(end) if inclusive else np.ceil(end),
+                                       side="right" if inclusive else "left"))
+        return slice(low, max(low, high))
+
+
+class CalendarIndex:
+    """The positions of the messages grouped by each part of their time, eg
+    every message sent in 2020 or every message sent at 10pm. A question
+    like "which messages were sent at 10pm in March" starts from the smaller
+    of the two groups and only checks the messages in it, instead of looking
+    at every message in the conversation.
+    """
+    fields = ("year", "month", "day", "hour", "minute", "second")
+
+    def __init__(self, columns):
+        """
+        Args:
+            columns (ConversationColumns): The columns of the conversation
+        """
+        self.columns = columns
+        # field -> value -> positions. Each field is grouped the first time
+        # it is asked for.
+        self.buckets = {}
+
+    def _buckets(self, field):
+        if field not in self.buckets:
+            values = getattr(self.columns, field)
+            # A stable sort keeps the positions in each group in order
+            order = np.argsort(values, kind="stable")
+            found, starts = np.unique(values[order], return_index=True)
+            ends = np.append(starts[1:], len(order))
+            self.buckets[field] = {value: order[start:end]
+                                   for value, start, end in zip(found.tolist(), starts, ends)}
+        return self.buckets[field]
+
+    def positions(self, **wanted):
+        """Returns the positions of the messages that match every field given.
+
+        Args:
+            wanted (int): field=value for any of the fields
+
+        Returns:
+            numpy.ndarray: The positions, in order
+        """
+        assert wanted and all(field in self.fields for field in wanted)
+        groups = []
+        for field, value in wanted.items():
+            group = self._buckets(field).get(value)
+            if group is None:
+                return np.empty(0, dtype=np.intp)
+            groups.append((len(group), field, group))
+
+        groups.sort(key=lambda x: x[0])
+        _, _, positions = groups[0]
+        for _, field, _ in groups[1:]:
+            positions = positions[getattr(self.columns, field)[positions] == wanted[field]]
+        return positions
+
+
+class DateIndex:
+    """The dates that have messages on them, in order, with where the messages
+    of each date start and end. The n-th date of the conversation, or of one
+    person's messages, is then found without searching. Used by the graphs
+    that plot one point per date, where a click gives the index of the date.
+    """
+    def __init__(self, columns):
+        """
+        Args:
+            columns (ConversationColumns): The columns of the conversation
+        """
+        self.columns = columns
+        days = columns.days
+        if columns.days_sorted:
+            self.order = None
+        else:
+            # The positions sorted by date, if a clock change put them out
+            self.order = np.argsort(days, kind="stable")
+            days = days[self.order]
+        self.dates, self.starts = np.unique(days, return_index=True)
+        self.ends = np.append(self.starts[1:], len(days))
+        # person -> the index in self.dates of each date they sent a message on
+        self._personal = {}
+
+    def __len__(self):
+        return len(self.dates)
+
+    def date_indexes(self, person=None):
+        """Returns the index in self.dates of every date, or of every date
+        person sent a message on.
+        """
+        if person is None:
+            return np.arange(len(self.dates))
+        if person not in self._personal:
+            columns = self.columns
+            their_dates = np.unique(columns.days[columns.sender_mask(person)])
+            self._personal[person] = np.searchsorted(self.dates, their_dates)
+        return self._personal[person]
+
+    def positions(self, index):
+        """Returns the positions of the messages on the index-th date. A slice,
+        unless the dates are out of order.
+        """
+        if self.order is None:
+            return slice(int(self.starts[index]), int(self.ends[index]))
+        return np.sort(self.order[self.starts[index]:self.ends[index]])
+
+    def many_positions(self, indexes):
+        """Returns the positions of the messages on many dates, one date after
+        the other in the order of indexes. Made in one go however many dates
+        there are.
+
+        Args:
+            indexes (numpy.ndarray): Indexes into self.dates
+        """
+        starts = self.starts[indexes]
+        lengths = self.ends[indexes] - starts
+        # Where each date's positions start in the output
+        offsets = np.cumsum(lengths) - lengths
+        positions = np.repeat(starts - offsets, lengths) + np.arange(lengths.sum())
+        if self.order is not None:
+            positions = self.order[positions]
+        return positions
+
+
+class WordIndex:
+    """The positions of the messages that use each word. The words are the
+    ones in Message.get_word_list(), so they are lower case with the
+    punctuation removed. Finding the messages with a word is then one
+    dictionary lookup instead of reading every message.
+    """
+    def __init__(self, word_lists):
+        """
+        Args:
+            word_lists (iterable(list(str))): The word list of every message, in order
+        """
+        # word -> word id
+        self.words = {}
+        word_ids = []
+        positions = []
+        for position, word_list in enumerate(word_lists):
+            for word in set(word_list):
+                word_ids.append(self.words.setdefault(word, len(self.words)))
+                positions.append(position)
+        word_ids = np.array(word_ids, dtype=np.int32)
+
+        # The positions grouped by word id. The sort is stable so each word's
+        # positions stay in order.
+        order = np.argsort(word_ids, kind="stable")
+        self.positions = np.array(positions, dtype=np.intp)[order]
+        self.starts = np.searchsorted(word_ids[order], np.arange(len(self.words) + 1))
+
+    def __contains__(self, word):
+        return word in self.words
+
+    def find(self, word):
+        """Returns the positions of the messages that use word, in order
+        """
+        word_id = self.words.get(word)
+        if word_id is None:
+            return np.empty(0, dtype=np.intp)
+        return self.positions[self.starts[word_id]:self.starts[word_id + 1]]
+
+
+class SubstringIndex:
+    """Finds the messages whose text contains a substring without reading all
+    of them. Every piece of three characters the substring has must also be
+    in a message that contains it, so only the messages with all of them are
+    checked. Shorter substrings use the single characters instead.
+
+    The pieces are stored as numbers so the index is made with NumPy: a
+    character is its code point, and three code points fit in one 64 bit
+    number. Each part of the index is only built the first time it is needed.
+    """
+    def __init__(self, texts):
+        """
+        Args:
+            texts (list(str)): The text of every message, in order. Lower
+                case them first to search ignoring case.
+        """
+        self.texts = texts
+        # piece size -> (sorted piece keys, where each key's positions start, positions)
+        self._pieces = {}
+
+    @staticmethod
+    def _keys(codepoints, size):
+        """Returns the key of every piece of size characters
+        """
+        codepoints = codepoints.astype(np.uint64)
+        if size == 1:
+            return codepoints
+        return (codepoints[:-2] << np.uint64(42)) | (codepoints[1:-1] << np.uint64(21)) | codepoints[2:]
+
+    @staticmethod
+    def _codepoints(text):
+        return np.frombuffer(text.encode("utf-32-le", "surrogatepass"), dtype=np.uint32)
+
+    def _build(self, size):
+        lengths = np.fromiter(map(len, self.texts), np.int64, len(self.texts))
+        owners = np.repeat(np.arange(len(self.texts), dtype=np.int32), lengths)
+        keys = self._keys(self._codepoints("".join(self.texts)), size)
+        if size == 3:
+            # Leave out the pieces that run into the next message
+            inside = owners[:-2] == owners[2:]
+            keys, owners = keys[inside], owners[:-2][inside]
+
+        # Number the keys in order, then sort (key number, position) pairs
+        # packed into one number, keeping each pair once. One sort of plain
+        # numbers is much faster than sorting by two columns.
+        found = np.unique(keys)
+        key_ids = np.searchsorted(found, keys)
+        pairs = np.unique((key_ids.astype(np.uint64) << np.uint64(32)) | owners.astype(np.uint64))
+        key_ids = (pairs >> np.uint64(32)).astype(np.int64)
+        positions = (pairs & np.uint64(0xFFFFFFFF)).astype(np.intp)
+        starts = np.searchsorted(key_ids, np.arange(len(found) + 1))
+        return found, starts, positions
+
+    def _find_piece(self, key, size):
+        if size not in self._pieces:
+            self._pieces[size] = self._build(size)
+        found, starts, positions = self._pieces[size]
+        i = int(np.searchsorted(found, key))
+        if i == len(found) or found[i] != key:
+            return np.empty(0, dtype=np.intp)
+        return positions[starts[i]:starts[i + 1]]
+
+    def find(self, substring):
+        """Returns the positions of the messages containing substring, in order
+        """
+        if substring == "":
+            return np.arange(len(self.texts))
+        size = 1 if len(substring) < 3 else 3
+        keys = np.unique(self._keys(self._codepoints(substring), size))
+        found = sorted((self._find_piece(key, size) for key in keys), key=len)
+        candidates = found[0]
+        for other in found[1:]:
+            candidates = np.intersect1d(candidates, other, assume_unique=True)
+        if len(substring) == size:
+            # The piece is the whole substring
+            return candidates
+        texts = self.texts
+        return candidates[np.fromiter((substring in texts[i] for i in candidates.tolist()),
+                                      bool, len(candidates))]
+
+
+# method name -> Counter of hits, misses and evictions. See aggregate_stats().
+_aggregate_stats = {}
+
+
+def aggregate_stats():
+    """Returns how well the memoized aggregates of every conversation have
+    been cached since the program started (or reset_aggregate_stats()).
+
+    Returns:
+        dict -> str : dict
+             -> method name : {"hits", "misses", "evictions", "hit_rate"}
+    """
+    stats = {}
+    for name, counts in _aggregate_stats.items():
+        calls = counts["hits"] + counts["misses"]
+        stats[name] = {
+            "hits": counts["hits"],
+            "misses": counts["misses"],
+            "evictions": counts["evictions"],
+            "hit_rate": counts["hits"] / calls if calls else 0.0
+        }
+    return stats
+
+
+def reset_aggregate_stats():
+    _aggregate_stats.clear()
+
+
+class AggregateCache:
+    """The results of the memoized methods of one conversation. Only the
+    most recently used results are kept. See memoize().
+
+    The dashboard makes figures on many threads at once. A result that one
+    thread evicts while another is using it is just worked out again.
+    """
+    def __init__(self, max_size):
+        """
+        Args:
+            max_size (int): The most results to keep
+        """
+        self.max_size = max_size
+        self.results = OrderedDict()
+
+    def __len__(self):
+        return len(self.results)
+
+    def get(self, key, default=None):
+        result = self.results.get(key, default)
+        if result is not default:
+            self._move_to_end(key)
+        return result
+
+    def put(self, key, result):
+        self.results[key] = result
+        self._move_to_end(key)
+        while len(self.results) > self.max_size:
+            try:
+                evicted, _ = self.results.popitem(last=False)
+            except KeyError:
+                # Another thread emptied it
+                break
+            _aggregate_stats.setdefault(evicted[0], Counter())["evictions"] += 1
+
+    def _move_to_end(self, key):
+        try:
+            self.results.move_to_end(key)
+        except KeyError:
+            # Another thread evicted it
+            pass
+
+    def clear(self):
+        self.results.clear()
+
+
+def aggregate_key(name, args=(), kwargs=None, uses_timezone=True):
+    """Returns the key of a memoized result. The timezone is part of it for
+    the results that depend on it, so changing the timezone doesn't return
+    results worked out for the old one.
+    """
+    return (name, timezone_name if uses_timezone else None, args, tuple(sorted((kwargs or {}).items())))
+
+
+_missing = object()
+
+
+def copy_result(result):
+    """Copies a memoized result so the caller can change it without changing
+    the cached one. Only the Counters, dicts, lists and tuples are copied,
+    what is inside them (strings, numbers, dates) can't be changed anyway.
+    """
+    if isinstance(result, Counter):
+        return result.copy()
+    if isinstance(result, dict):
+        return {key: copy_result(value) for key, value in result.items()}
+    if isinstance(result, (list, tuple)):
+        if not any(isinstance(item, (dict, list, tuple)) for item in result[:1]):
+            return type(result)(result)
+        return type(result)(copy_result(item) for item in result)
+    return result
+
+
+def memoize(method=None, uses_timezone=True):
+    """Caches what a MessengerConversation method returns for each set of
+    arguments, in the conversation's AggregateCache. The cache is emptied
+    when the messages change. The arguments must be hashable. Default
+    arguments are filled in before the key is made, so get_ngram_counts()
+    and get_ngram_counts(2) share a result. Every call gets its own copy of
+    the result, see copy_result().
+
+    Args:
+        uses_timezone (bool, optional): The result depends on the timezone.
+            Defaults to True.
+    """
+    if method is None:
+        return partial(memoize, uses_timezone=uses_timezone)
+    name = method.__name__
+    signature = inspect.signature(method)
+
+    @wraps(method)
+    def memoized(self, *args, **kwargs):
+        bound = signature.bind(self, *args, **kwargs)
+        bound.apply_defaults()
+        arguments = dict(bound.arguments)
+        del arguments[next(iter(signature.parameters))]
+        key = aggregate_key(name, kwargs=arguments, uses_timezone=uses_timezone)
+        stats = _aggregate_stats.setdefault(name, Counter())
+        result = self._aggregates.get(key, _missing)
+        if result is not _missing:
+            stats["hits"] += 1
+            return copy_result(result)
+        stats["misses"] += 1
+        result = method(self, *args, **kwargs)
+        self._aggregates.put(key, result)
+        return copy_result(result)
+    return memoized
+
+
+class MessageTimestamps:
+    """The timestamp_ms of each message in a sorted list of messages, for
+    bisect. Nothing is copied, so searching it costs O(log n).
+    """
+    def __init__(self, messages):
+        self.messages = messages
+
+    def __len__(self):
+        return len(self.messages)
+
+    def __getitem__(self, i):
+        return self.messages[i].timestamp_ms
+
+
 class MessengerConversation:
-    def __init__(self, filename=None, messages=None, participants=None, title=None):
+    # The most aggregate results each conversation keeps. See memoize().
+    aggregate_cache_size = 32
+    # Goes up each time add_messages() changes the messages. Views use it to
+    # tell that their positions don't line up anymore. See ConversationView
+    _generation = 0
+
+    def __init__(self, filename=None, messages=None, participants=None, title=None, stream=False,
+                 repair_encoding=False):
         assert filename is None or type(filename) == str
         assert messages is None or type(messages) == list
         if type(participants) == str:
@@ -221,32 +1318,81 @@ class MessengerConversation:
         self.participants = []
         self.messages = []
         self.title = title
-        self._parse_json(filename)
+        self._parse_json(filename, stream, repair_encoding)
         self._load_preexisting_messages(messages, participants)
 
-        self._personal_emoji_counts = None
-        self._total_emoji_counts = None
-        self._get_word_count_buffer = None
+        # Lookup structures built from the messages the first time they are
+        # needed. See _index().
+        self._indexes = {}
+        self._aggregates = AggregateCache(self.aggregate_cache_size)
 
-    def _parse_json(self, filename):
+    def _parse_json(self, filename, stream=False, repair_encoding=False):
+        """Reads a message_N.json file into this conversation.
+
+        Args:
+            filename (str): The json file
+            stream (bool, optional): Turn the messages into Message objects
+                while the file is read, instead of decoding the whole file
+                first. This keeps the memory used to about the size of the
+                messages themselves, which matters for very large chats.
+                Defaults to False.
+            repair_encoding (bool, optional): Fix the garbled unicode of the
+                whole file at once with repair_json instead of calling
+                convert_unicode on every name and message. If the file can't
+                be repaired like that, it falls back to the usual way. The
+                raw export strings aren't kept, so Message.get_raw_text()
+                gives the repaired text. It isn't faster, benchmark.py
+                measures it at about 0.9x of the usual way. Defaults to False.
+        """
         # Read Json file
         if filename is not None:
             # rb stops weird decoding issues
             # Allowing FileNotFoundError to be thrown
             with open(filename, "rb") as f:
-                json_dump = json.loads(f.read())
+                if stream:
+                    try:
+                        json_dump = self._parse_json_stream(f, repair_encoding)
+                        repaired = repair_encoding
+                    except EncodingRepairError:
+                        f.seek(0)
+                        self.messages = []
+                        json_dump = self._parse_json_stream(f, False)
+                        repaired = False
+                else:
+                    data = f.read()
+                    json_dump = repair_json(data) if repair_encoding else None
+                    repaired = json_dump is not None
+                    if not repaired:
+                        json_dump = json.loads(data)
+                    del data
+                    for message in json_dump["messages"]:
+                        self.messages.append(Message(message, repaired))
+
+            fix = _unchanged if repaired else convert_unicode
+            if not repaired:
+                Message.Content.normalize_all(self._contents())
 
             for person in json_dump["participants"]:
-                self.participants.append(convert_unicode(person["name"]))
-
-            for message in json_dump["messages"]:
-                self.messages.append(Message(message))
+                self.participants.append(fix(person["name"]))
             
             # Title
             if json_dump["thread_type"] == "Regular":
                 self.title = " and ".join(self.participants) + "'s chat"
             else:
-                self.title = convert_unicode(json_dump["title"])
+                self.title = fix(json_dump["title"])
+
+    def _parse_json_stream(self, f, repair_encoding=False):
+        """Streams the "messages" array of the file straight into Message
+        objects. Everything else in the file is returned as a dictionary.
+        """
+        json_dump = {}
+        reader = JsonStreamReader(f, repair_encoding=repair_encoding)
+        for key, value in reader.items(stream_key="messages"):
+            if key == "messages":
+                self.messages.append(Message(value, repair_encoding))
+            else:
+                json_dump[key] = value
+        return json_dump
     
     def _load_preexisting_messages(self, messages, participants):
         if participants is not None:
@@ -264,8 +1410,158 @@ class MessengerConversation:
                 self.participants.append(message.sender)
         
         # Sort the messages by the date
-        self.messages.sort(key=lambda x: x.time)
+        self.messages.sort(key=lambda x: x.timestamp_ms)
     
+    def add_messages(self, messages):
+        """Adds the messages that aren't already in this conversation. A
+        message is already here if one with the same Message.key() is. Only
+        the existing messages sent at the same millisecond as a new one are
+        compared, so this costs about the same as the number of new messages.
+        The conversation is changed in place.
+
+        Args:
+            messages (list(Message)): The messages to add. Eg, from a newer export
+
+        Returns:
+            int: The number of messages that were added
+        """
+        # The columns aren't used, they take as long to make as every message
+        timestamps = MessageTimestamps(self.messages)
+        last = self.messages[-1].timestamp_ms if self.messages else None
+        seen = set()
+        new_messages = []
+        for message in messages:
+            key = message.key()
+            if key in seen:
+                continue
+            seen.add(key)
+            if last is not None and message.timestamp_ms <= last:
+                # The messages are sorted, so the ones sent at the same time
+                # are next to each other.
+                start = bisect.bisect_left(timestamps, message.timestamp_ms)
+                end = bisect.bisect_right(timestamps, message.timestamp_ms)
+                if any(self.messages[i].key() == key for i in range(start, end)):
+                    continue
+            new_messages.append(message)
+
+        if not new_messages:
+            return 0
+
+        new_messages.sort(key=lambda x: x.timestamp_ms)
+        in_order = last is None or new_messages[0].timestamp_ms >= last
+        # A new list, so the views made from the old one still have it
+        messages = self.messages + new_messages
+        if not in_order:
+            # Two sorted runs, which sort() merges in one pass
+            messages.sort(key=lambda x: x.timestamp_ms)
+        self.messages = messages
+        for message in new_messages:
+            if message.sender not in self.participants:
+                self.participants.append(message.sender)
+
+        # Everything worked out from the old messages is out of date now
+        self._aggregates.clear()
+        self._indexes = {}
+        self._generation += 1
+        return len(new_messages)
+
+    def __getstate__(self):
+        """The indexes and aggregates are left out when pickling. They are
+        quick to rebuild and would only make the cache files larger.
+        """
+        state = self.__dict__.copy()
+        state["_indexes"] = {}
+        state["_aggregates"] = AggregateCache(self.aggregate_cache_size)
+        return state
+
+    def _index(self, name, build):
+        """Returns the lookup structure called name, building it with build()
+        the first time it is asked for.
+        """
+        if name not in self._indexes:
+            self._indexes[name] = build()
+        return self._indexes[name]
+
+    def get_columns(self):
+        """Returns the messages as ConversationColumns. These are built once
+        and reused by the aggregate methods.
+        """
+        columns = self._index("columns", lambda: ConversationColumns(self.messages, self.participants))
+        if columns.timezone is not timezone:
+            # set_timezone() was called since they were made. The indexes
+            # made from the old columns are out of date too.
+            self._indexes.clear()
+            columns = self._index("columns", lambda: ConversationColumns(self.messages, self.participants))
+        return columns
+
+    def get_date_index(self):
+        """Returns the DateIndex of the messages. Built once, like the columns.
+        """
+        columns = self.get_columns()
+        return self._index("dates", lambda: DateIndex(columns))
+
+    def get_calendar(self):
+        """Returns the CalendarIndex of the messages. Built once, like the
+        columns.
+        """
+        columns = self.get_columns()
+        return self._index("calendar", lambda: CalendarIndex(columns))
+
+    def _contents(self):
+        """Returns the Content of every message that has one
+        """
+        return [message.content for message in self.messages if message.content is not None]
+
+    def _tokenize(self):
+        """Makes the word lists of all the messages in one batch. Only the
+        first call does any work.
+        """
+        def tokenize():
+            Message.Content.tokenize_all(self._contents())
+            return True
+        return self._index("tokenized", tokenize)
+
+    def get_word_index(self):
+        """Returns the WordIndex of the messages. Built once, right after the
+        messages are tokenized.
+        """
+        def build():
+            self._tokenize()
+            return WordIndex(message.get_word_list() for message in self.messages)
+        return self._index("words", build)
+
+    def _word_positions(self, word):
+        """Returns the positions of the messages that use word
+        """
+        return self.get_word_index().find(word)
+
+    def get_substring_index(self, case_sensitive=False):
+        """Returns the SubstringIndex of the message texts. There is one for
+        each case_sensitive, each built the first time it is used.
+        """
+        def build():
+            texts = [message.get_text() for message in self.messages]
+            if not case_sensitive:
+                texts = [text.lower() for text in texts]
+            return SubstringIndex(texts)
+        return self._index(("substrings", case_sensitive), build)
+
+    def _substring_positions(self, substring, case_sensitive):
+        """Returns the positions of the messages containing substring. It
+        must already be lower case if case_sensitive is False.
+        """
+        return self.get_substring_index(case_sensitive).find(substring)
+
+    def _subset(self, positions, participants=None):
+        """Returns a ConversationView of the messages at positions. The
+        positions must be in increasing order.
+
+        Args:
+            positions (slice or iterable(int)): Message positions
+            participants (list(str), optional): Defaults to self.participants.
+        """
+        return ConversationView(self, positions, participants)
+
     def __repr__(self):
         """A brief summary of the people involved in the conversation
         """
@@ -292,26 +1588,39 @@ class MessengerConversation:
             [MessengerConversation]: The merged conversation
         """
         
-        new_participants = []
-        new_participants += self.participants
-        new_participants += other.participants
-        new_participants = list(set(new_participants))
-        
+        return MessengerConversation.combine([self, other])
+
+    @staticmethod
+    def combine(conversations):
+        """Combines many conversations into one. This gives the same result
+        as adding them together one by one, except the messages are only
+        copied and sorted once instead of after every addition. Use this when
+        joining the message_N.json files of a long chat.
+
+        Args:
+            conversations (list(MessengerConversation)): The conversations to
+                combine
+
+        Returns:
+            MessengerConversation: The combined conversation
+        """
+        participants = []
+        titles = []
+        messages = []
+        for convo in conversations:
+            for person in convo.participants:
+                if person not in participants:
+                    participants.append(person)
+            if convo.title is not None and convo.title not in titles:
+                titles.append(convo.title)
+            messages += convo.messages
+
         # New title
-        if self.title == None and other.title == None:
-            title == None
-        elif self.title == None:
-            title = other.title
-        elif other.title == None:
-            title = self.title
-        elif self.title == other.title:
-            title = self.title
-        else:
-            title = "{} + {}".format(self.title, other.title)
+        title = " + ".join(titles) if titles else None
 
         return MessengerConversation(
-            messages=self.messages + other.messages,
-            participants=new_participants,
+            messages=messages,
+            participants=participants,
             title=title
         )
 
@@ -370,35 +1679,26 @@ class MessengerConversation:
         return output
 
     def first(self):
-        """Returns the time of the first message ever sent.
+        """Returns the time of the first message ever sent. The messages are
+        kept sorted by time, so it is the first one.
         """
-        current_min = None
-        for message in self.messages:
-            if current_min is None:
-                current_min = message.time
-
-            if message.time < current_min:
-                current_min = message.time
-        return current_min
+        if len(self.messages) == 0:
+            return None
+        return self.messages[0].time
 
     def last(self):
         """Returns the time of the last message ever sent
         """
-        current_max = None
-        for message in self.messages:
-            if current_max is None:
-                current_max = message.time
-
-            if message.time > current_max:
-                current_max = message.time
-        return current_max
+        if len(self.messages) == 0:
+            return None
+        return self.messages[-1].time
     
+    @memoize
     def get_participants_from_message_order(self):
-        participants = []
-        for message in self.messages:
-            if message.sender not in participants:
-                participants.append(message.sender)
-        return participants
+        columns = self.get_columns()
+        sender_ids, first_positions = np.unique(columns.sender_ids, return_index=True)
+        order = np.argsort(first_positions)
+        return [columns.senders[i] for i in sender_ids[order].tolist()]
     
     def find_messages_with_substring(self, substring, case_sensitive=False):
         """Finds the messages that contain the substring. Ignores case by
@@ -412,19 +1712,9 @@ class MessengerConversation:
             MessengerConversation: Containing only the found messages (useful
                 for further analysis)
         """
-        found_messages = []
-        for message in self.messages:
-            message_text = message.get_text()
-            
-            if not case_sensitive:
-                message_text = message_text.lower()
-                substring = substring.lower()
-                
-            if substring in message_text:
-                found_messages.append(message)
-        return MessengerConversation(messages=found_messages,
-                                     participants=self.participants,
-                                     title=self.title)
+        if not case_sensitive:
+            substring = substring.lower()
+        return self._subset(self._substring_positions(substring, case_sensitive))
 
     def find_messages_with_word(self, word):
         """Find messages containing the specfic word. This mustn't be confused
@@ -437,13 +1727,31 @@ class MessengerConversation:
         Returns:
             MessengerConversation: Containing only the found messages.
         """
-        found_messages = []
-        for message in self.messages:
-            if word.lower() in message.get_word_list():
-                found_messages.append(message)
-        return MessengerConversation(messages=found_messages,
-                                     participants=self.participants,
-                                     title=self.title)
+        return self._subset(self._word_positions(word.lower()))
+
+    def find_messages_with_words(self, words, match_all=True):
+        """Finds the messages containing several words. See
+        find_messages_with_word.
+
+        Args:
+            words (list(str)): The search words
+            match_all (bool, optional): True finds the messages with every
+                word, False the messages with any of them. Defaults to True.
+
+        Returns:
+            MessengerConversation: Containing only the found messages.
+        """
+        if len(words) == 0:
+            return self._subset([])
+        # Starting from the rarest word keeps the intersections small
+        found = sorted((self._word_positions(word.lower()) for word in words), key=len)
+        positions = found[0]
+        for other in found[1:]:
+            if match_all:
+                positions = np.intersect1d(positions, other, assume_unique=True)
+            else:
+                positions = np.union1d(positions, other)
+        return self._subset(positions)
 
     def get_all_personal_messages(self):
         """Returns a dictionary of participants as the keys, and the stored
@@ -468,9 +1776,10 @@ class MessengerConversation:
             MessengerConversation: Containing only the person's messages
         """
         assert person in self.participants, "{} not in {}".format(person, self)
-        messages = list(filter(lambda m: m.sender == person, self.messages))
-        return MessengerConversation(messages=messages, participants=[person], title=self.title)
+        positions = np.flatnonzero(self.get_columns().sender_mask(person))
+        return self._subset(positions, participants=[person])
         
+    @memoize
     def get_daily_chat_frequencies(self): 
         """Returns a dictionary containing the messages counts per day
         for each person.
@@ -479,50 +1788,85 @@ class MessengerConversation:
             dict -> str : Counter(datetime.datetime : int)
                  -> person : Counter(date : count)
         """
-        individual_message_count = {}
-        for person in self.participants:
-            messages = self.get_personal_messages(person)
-            message_count = Counter([message.time.date() for message in messages])
-            individual_message_count[person] = message_count
-        return individual_message_count
+        columns = self.get_columns()
+        return self._count_per_person(columns.days, datetime.date.fromordinal)
     
+    @memoize
     def get_hourly_chat_frequencies(self):
-        hourly_frequencies = {}
-        for person in self.participants:
-            messages = self.get_personal_messages(person)
-            hourly_frequencies[person] = Counter([message.time.hour for message in messages])
-        return hourly_frequencies
+        columns = self.get_columns()
+        return self._count_per_person(columns.hour)
 
+    @memoize
     def get_weekday_chat_frequencies(self):
-        weekday_frequencies = {}
+        columns = self.get_columns()
+        return self._count_per_person(columns.weekday, lambda weekday: calendar.day_name[weekday])
+
+    def _count_per_person(self, column, label=None):
+        """Counts how many messages each person sent for every value in the
+        column.
+
+        Args:
+            column (np.ndarray): A column from ConversationColumns
+            label (<function>, optional): Turns a column value into the key
+                used in the Counter. Defaults to using the value itself.
+
+        Returns:
+            dict -> str : Counter(<label> : int)
+                 -> person : Counter(label : count)
+            Each Counter has its labels in the order the person first sent
+            a message with them, like counting the messages one by one.
+        """
+        columns = self.get_columns()
+        values, value_counts, first_seen = columns.count_by_sender(column)
+        values = values.tolist()
+        if label is not None:
+            values = [label(value) for value in values]
+
+        counts = {}
         for person in self.participants:
-            messages = self.get_personal_messages(person)
-            weekday_frequencies[person] = Counter([message.time.strftime("%A") for message in messages])
-        return weekday_frequencies
+            sender_id = columns.sender_id(person)
+            if sender_id < 0:
+                # In the participants but never sent anything
+                counts[person] = Counter()
+                continue
+            row = value_counts[sender_id]
+            sent = np.flatnonzero(row)
+            sent = sent[np.argsort(first_seen[sender_id][sent], kind="stable")]
+            counts[person] = Counter(dict(zip([values[i] for i in sent.tolist()], row[sent].tolist())))
+        return counts
 
+    @memoize
     def get_dates(self):
         """Returns a sorted list of dates for every message ever sent.
 
         Returns:
             list(datetime.datetime): List of dates
         """
-        dates = list(set([message.time for message in self.messages]))
-        dates.sort()
-        return dates
+        seconds = np.unique(self.get_columns().timestamps // 1000)
+        return [convert_timestamp(second) for second in seconds.tolist()]
     
+    @memoize(uses_timezone=False)
     def get_word_count(self):
         """Returns a counter containing the counts of every single word in the
         conversation.
         """
-        if self._get_word_count_buffer is not None:
-            return self._get_word_count_buffer
-        
+        self._tokenize()
         message_word_counts = []
         for message in self.messages:
             message_word_counts += message.get_word_list()
-        self._get_word_count_buffer = Counter(message_word_counts)
-        return self._get_word_count_buffer
+        return Counter(message_word_counts)
     
+    @memoize(uses_timezone=False)
+    def get_ngram_counts(self, n=2):
+        """Counts every run of n words in a row, eg n=2 counts pairs of words
+        like ("good", "morning"). See count_ngrams().
+
+        Returns:
+            Counter -> tuple(str) : int
+        """
+        self._tokenize()
+        return count_ngrams((message.get_word_list() for message in self.messages), n)
+
     def get_messages_at_time(self, year=None, month=None, day=None, hour=None, minute=None, second=None):
         """Returns a filtered list of messages that match the time input. At
         least one field must be set or it will return [].
@@ -535,32 +1879,34 @@ class MessengerConversation:
         Returns:
             MessengerConversation : Containing the matching messages
         """
-        messages = self.messages
         if year is None and month is None and day is None and hour is None \
             and minute is None and second is None:
             return self
         
+        wanted = {}
+        
         if year is not None and year >= 0:
-            messages = list(filter(lambda x: x.time.year == year, messages))
+            wanted["year"] = year
         
         if month is not None and month > 0:
-            messages = list(filter(lambda x: x.time.month == month, messages))
+            wanted["month"] = month
         
         if day is not None and day > 0:
-            messages = list(filter(lambda x: x.time.day == day, messages))
+            wanted["day"] = day
         
         if hour is not None and hour >= 0:
-            messages = list(filter(lambda x: x.time.hour == hour, messages))
+            wanted["hour"] = hour
         
         if minute is not None and minute >= 0:
-            messages = list(filter(lambda x: x.time.minute == minute, messages))
+            wanted["minute"] = minute
         
         if second is not None and second >= 0:
-            messages = list(filter(lambda x: x.time.second == second, messages))
+            wanted["second"] = second
         
-        return MessengerConversation(messages=messages,
-                                     participants=self.participants,
-                                     title=self.title)
+        if not wanted:
+            # Every field was turned off
+            return self._subset(slice(None))
+        return self._subset(self.get_calendar().positions(**wanted))
     
     def get_time_range(self, start, end, inclusive=True):
         """Returns the messages from inside the range [start, end] unless
@@ -574,29 +1920,15 @@ class MessengerConversation:
         Returns:
             MessengerConversation: Containing the range of messages
         """
-        found_range = []
-        
         if start is None and end is None:
             return self
         
-        for message in self.messages:
-            if end is None:
-                before_end = True
-            elif inclusive:
-                before_end = message.time <= end
-            else:
-                before_end = message.time < end
-            
-            if start is None:
-                after_start = True
-            else:
-                after_start = message.time >= start
-            
-            if after_start and before_end:
-                found_range.append(message)
-        return MessengerConversation(messages=found_range,
-                                     participants=self.participants,
-                                     title=self.title)
+        # Compare the seconds since the epoch because that's what message.time
+        # is made from. The messages are sorted so the range is one slice.
+        return self._subset(self.get_columns().time_slice(
+            None if start is None else to_timestamp(start),
+            None if end is None else to_timestamp(end),
+            inclusive))
     
     def get_messages_from_date_index(self, indexes, person=None):
         """Sometimes you may want to retrieve some messages from specific "date indexes"
@@ -615,18 +1947,8 @@ class MessengerConversation:
             MessengerConversation: Containing all messages from the dates in the date
                                    indexes list
         """
-        if person is not None:
-            conversation = self.get_personal_messages(person)
-        else:
-            conversation = self
-            
-        all_dates = conversation.get_dates()
-        all_dates = list(set([date.date() for date in all_dates]))
-        all_dates.sort()
-        
-        # print(conversation)
-        # print(conversation.as_messenger())
-        # print([m.strftime("%d %B %Y") for m in all_dates])
+        date_index = self.get_date_index()
+        all_dates = date_index.date_indexes(person)
         
         # Make indexes a list
         if type(indexes) == int:
@@ -635,18 +1957,18 @@ class MessengerConversation:
         for index in indexes:
             assert 0 <= index < len(all_dates)
         
-        convos_from_indexes = []
-        for index in indexes:
-            selected_date = all_dates[index]
-
-            convos_from_indexes.append(self.get_messages_at_time(
-                year=selected_date.year,
-                month=selected_date.month,
-                day=selected_date.day
-            ))
-
-        return sum(convos_from_indexes, MessengerConversation(title=self.title))
-
+        if len(indexes) == 0:
+            return MessengerConversation(title=self.title)
+        if len(indexes) == 1:
+            return self._subset(date_index.positions(all_dates[indexes[0]]))
+
+        picked = all_dates[np.asarray(indexes)]
+        positions = date_index.many_positions(picked)
+        if date_index.order is not None or not (picked[1:] > picked[:-1]).all():
+            positions = np.sort(positions, kind="stable")
+        return self._subset(positions)
+
+    @memoize
     def get_who_messaged_first(self):
         """Returns an dictionary containing the unique dates and the person
         who sent the first message on that day.
@@ -655,11 +1977,14 @@ class MessengerConversation:
             Dict -> datetime.date : str
                  -> date : sender
         """
-        who_sent_first = {}
-        for message in self.messages:
-            if message.time.date() not in who_sent_first:
-                who_sent_first[message.time.date()] = message.sender
-        return who_sent_first
+        columns = self.get_columns()
+        date_index = self.get_date_index()
+        first_positions = date_index.starts
+        if date_index.order is not None:
+            first_positions = date_index.order[first_positions]
+        senders = columns.sender_ids[first_positions]
+        return {datetime.date.fromordinal(day): columns.senders[sender]
+                for day, sender in zip(date_index.dates.tolist(), senders.tolist())}
 
     def get_all_emoji_counts(self):
         """Returns a tuple of (get_total_emoji_counts, get_personal_emoji_counts)
@@ -672,45 +1997,59 @@ class MessengerConversation:
         
         return total_emoji_counts, personal_emoji_counts
 
+    @memoize(uses_timezone=False)
+    def _emoji_counts(self):
+        """Counts the emojis of every message in one pass.
+
+        Returns:
+            (Counter, dict): The total and personal counts
+        """
+        columns = self.get_columns()
+        return self._emoji_counts_from(count_emojis_by_sender(
+            (message.get_text() for message in self.messages),
+            columns.sender_ids.tolist(), len(columns.senders)))
+
+    def _emoji_counts_from(self, counts):
+        """Makes the total and personal counts from the emoji counts of each
+        sender id, see count_emojis_by_sender().
+        """
+        patterns = emoji_matcher().patterns
+        columns = self.get_columns()
+        personal_emoji_counts = {
+            person: Counter(dict(zip(patterns, counts[columns.sender_id(person)])))
+            for person in self.participants
+        }
+        total = [sum(column) for column in zip(*counts)]
+        # Filter emojis counts == 0
+        total_emoji_counts = Counter({e: count for e, count in zip(patterns, total) if count > 0})
+        return total_emoji_counts, personal_emoji_counts
+
+    def set_counts(self, word_count=None, sender_emoji_counts=None):
+        """Stores counts that were worked out somewhere else, eg on many
+        processes by messenger_analytics, so get_word_count() and the emoji
+        methods return them instead of counting again.
+
+        Args:
+            word_count (Counter, optional): What get_word_count() returns
+            sender_emoji_counts (list(list(int)), optional): What
+                count_emojis_by_sender() returns for the messages of this
+                conversation, with the sender ids of get_columns()
+        """
+        if word_count is not None:
+            self._aggregates.put(aggregate_key("get_word_count", uses_timezone=False), word_count)
+        if sender_emoji_counts is not None:
+            self._aggregates.put(aggregate_key("_emoji_counts", uses_timezone=False),
+                                 self._emoji_counts_from(sender_emoji_counts))
+
     def get_personal_emoji_counts(self):
         """Returns dictionary containing counters for each person for all their
         emoji counts. Caches the result as it is very computationally expensive.
-        Uses multithreading to achieve a speed up.
 
         Returns:
             dict -> str : Counter(str : int)
                     person : Counter(emoji : count)
         """
-        if self._personal_emoji_counts is not None:
-            return self._personal_emoji_counts
-        
-        self._personal_emoji_counts = {}
-        
-        return_queue = deque()
-        
-        def _get_persons_emoji_count(person):
-            my_messages = list(filter(lambda x: x.sender == person, self.messages))
-            emoji_counts = {e: 0 for e in emoji.EMOJI_UNICODE.values()}
-            for message in my_messages:
-                for e in emoji_counts.keys():
-                    # emoji_counts[e] += message.text.count(e)
-                    emoji_counts[e] += message.get_text().count(e)
-            return_queue.append((person, Counter(emoji_counts)))
-        
-        personal_threads = []
-        for person in self.participants:
-            thread = threading.Thread(target=_get_persons_emoji_count, args=(person, ))
-            personal_threads.append(thread)
-            thread.start()
-        
-        for thread in personal_threads:
-            thread.join()
-        
-        while len(return_queue) != 0:
-            result = return_queue.pop()
-            self._personal_emoji_counts[result[0]] = result[1]
-            
-        return self._personal_emoji_counts
+        return self._emoji_counts()[1]
     
     def get_total_emoji_counts(self):
         """Returns Counter containing the counts of all the emojis
@@ -719,21 +2058,158 @@ class MessengerConversation:
             Counter -> str : int
                     -> emoji : count
         """
-        if self._total_emoji_counts is not None:
-            return self._total_emoji_counts
+        return self._emoji_counts()[0]
+
+
+class ConversationView(MessengerConversation):
+    """Some of the messages of another conversation, eg one person's messages
+    or the messages of one day. A view only remembers which positions of the
+    original conversation it has, so making one doesn't copy or sort any
+    messages. Its columns are cut out of the original's columns instead of
+    being made from the messages again. The message list is only made the
+    first time it is used.
+
+    Views of views point straight at the original conversation, so a long
+    chain of drill downs stays as cheap as the first one. Use materialize()
+    to get a normal MessengerConversation.
+
+    A view keeps the original's message list and columns as they were when
+    it was made. If messages are added to the original after that, the view
+    makes its own message list from the old one and stops using the
+    original. See _check_root().
+    """
+    def __init__(self, parent, positions, participants=None):
+        """
+        Args:
+            parent (MessengerConversation): The conversation to take the messages from
+            positions (slice or iterable(int)): Positions in parent, in increasing order
+            participants (list(str), optional): Defaults to parent.participants.
+        """
+        if participants is None:
+            participants = parent.participants
+        if isinstance(parent, ConversationView):
+            parent._check_root()
+        if isinstance(positions, slice):
+            positions = slice(*positions.indices(len(parent.get_columns()))[:2])
+        else:
+            positions = np.asarray(positions, dtype=np.intp)
+
+        if isinstance(parent, ConversationView) and parent._root is not None:
+            # Turn positions in the parent into positions in the root
+            if isinstance(parent._positions, slice):
+                offset = parent._positions.start
+                if isinstance(positions, slice):
+                    positions = slice(positions.start + offset, positions.stop + offset)
+                else:
+                    positions = positions + offset
+            else:
+                positions = parent._positions[positions]
+            parent = parent._root
+
+        self._root = parent
+        self._root_generation = parent._generation
+        self._root_messages = parent.messages
+        self._root_columns = parent.get_columns()
+        self._positions = positions
+        self._messages = None
+        self.title = parent.title
+
+        self._indexes = {}
+        self._aggregates = AggregateCache(self.aggregate_cache_size)
+
+        # The participants are worked out from the columns, like
+        # _load_preexisting_messages does from the messages
+        columns = self._take_columns(participants)
+        self.participants = list(columns.senders)
+        self._indexes["columns"] = columns
+
+    def _check_root(self):
+        """Stops using the original conversation if add_messages() has changed
+        it since this view was made. The positions are into its old messages,
+        so the view's messages are made from those first.
+        """
+        if self._root is not None and self._root._generation != self._root_generation:
+            self.messages = self.messages
+            self._root_messages = self._root_columns = None
+
+    def _take_columns(self, participants):
+        """Cuts the columns of this view out of the original's
+        """
+        if self._root_columns.timezone is not timezone:
+            # set_timezone() was called since they were made
+            self._root_columns = self._root.get_columns()
+        return self._root_columns.take(self._positions, participants)
+
+    @property
+    def messages(self):
+        if self._messages is None:
+            if isinstance(self._positions, slice):
+                self._messages = self._root_messages[self._positions]
+            else:
+                root_messages = self._root_messages
+                self._messages = [root_messages[i] for i in self._positions.tolist()]
+        return self._messages
+
+    @messages.setter
+    def messages(self, messages):
+        # Changing the messages (see add_messages) cuts the view off from
+        # the original conversation
+        self._messages = messages
+        self._root = None
+
+    def get_columns(self):
+        self._check_root()
+        if self._root is None:
+            return super().get_columns()
+        columns = self._indexes.get("columns")
+        if columns is None or columns.timezone is not timezone:
+            # set_timezone() was called since they were made
+            self._indexes.clear()
+            columns = self._indexes["columns"] = self._take_columns(self.participants)
+        return columns
+
+    def _word_positions(self, word):
+        """Uses the word index of the original conversation, so a view never
+        has to build its own.
+        """
+        self._check_root()
+        if self._root is None:
+            return super()._word_positions(word)
+        return self._from_root(self._root._word_positions(word))
+
+    def _substring_positions(self, substring, case_sensitive):
+        """Uses the substring index of the original conversation
+        """
+        self._check_root()
+        if self._root is None:
+            return super()._substring_positions(substring, case_sensitive)
+        return self._from_root(self._root._substring_positions(substring, case_sensitive))
+
+    def _from_root(self, found):
+        """Turns sorted positions in the original conversation into positions
+        in this view, leaving out the ones that aren't in it.
+        """
+        if isinstance(self._positions, slice):
+            low, high = np.searchsorted(found, [self._positions.start, self._positions.stop])
+            return found[low:high] - self._positions.start
+        # Where each found position is in this view, if it is in it at all
+        in_view = np.searchsorted(self._positions, found)
+        inside = in_view < len(self._positions)
+        in_view, found = in_view[inside], found[inside]
+        return in_view[self._positions[in_view] == found]
+
+    def materialize(self):
+        """Returns a normal MessengerConversation with the messages of this view
+        """
+        return MessengerConversation(messages=list(self.messages),
+                                     participants=self.participants,
+                                     title=self.title)
+
+    def __reduce__(self):
+        # Pickle the messages, not the whole original conversation
+        return (MessengerConversation, (None, list(self.messages), self.participants, self.title))
+
 
-        total_emoji_counts = {e: 0 for e in emoji.EMOJI_UNICODE.values()}
-        for message in self.messages:
-            for e in total_emoji_counts.keys():
-                total_emoji_counts[e] += message.get_text().count(e)
-        
-        # Filter emojis counts == 0
-        total_emoji_counts = dict(filter(lambda item: item[1] > 0, total_emoji_counts.items()))
-        self._total_emoji_counts = Counter(total_emoji_counts)
-        
-        return self._total_emoji_counts
-    
-    
 def main():
     your_convo = MessengerConversation("hangs.json")
     # your_convo = MessengerConversation("message_2.json")
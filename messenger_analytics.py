@@ -0,0 +1,191 @@
+import os
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+# Our imports
+from messenger import count_emojis_by_sender, count_ngrams, tokenize_batch
+
+
+def split(items, parts):
+    """Splits a list into parts lists of about the same length, keeping the
+    order.
+    """
+    size, extra = divmod(len(items), parts)
+    pieces = []
+    start = 0
+    for i in range(parts):
+        end = start + size + (1 if i < extra else 0)
+        pieces.append(items[start:end])
+        start = end
+    return pieces
+
+
+# These run on the worker processes, so they have to be top level functions.
+# They are given plain strings and numbers because those are quick to send
+# to another process, unlike Message objects.
+
+def _count_words(texts):
+    counts = Counter()
+    for words in tokenize_batch(texts):
+        counts.update(words)
+    return counts
+
+
+def _count_emojis(texts, sender_ids, sender_count):
+    return count_emojis_by_sender(texts, sender_ids, sender_count)
+
+
+def _count_ngrams(texts, n):
+    return count_ngrams(tokenize_batch(texts), n)
+
+
+def merge_counters(counters):
+    """Adds Counters together in order. Keys are added in the order they are
+    first seen, so the result matches counting everything at once, down to
+    the order most_common() breaks ties in.
+    """
+    merged = Counter()
+    for counter in counters:
+        merged.update(counter)
+    return merged
+
+
+def merge_sender_counts(partials):
+    """Adds up the count_emojis_by_sender() results of each chunk
+    """
+    merged = [list(counts) for counts in partials[0]]
+    for partial in partials[1:]:
+        for total, counts in zip(merged, partial):
+            for i, count in enumerate(counts):
+                if count:
+                    total[i] += count
+    return merged
+
+
+class PartitionedAnalytics:
+    """Runs the slow counts of a conversation (words, emojis and n-grams) on a
+    pool of processes. The messages are split into chunks in order, each
+    chunk is counted on its own and the chunk results are added together, so
+    the results are the same as counting the whole conversation on one
+    process.
+
+    Use it as a context manager to share one pool between several counts:
+
+        with PartitionedAnalytics(convo) as analytics:
+            analytics.precompute()
+            pairs = analytics.ngram_counts(2)
+
+    Or pass in an executor to share it between conversations, see
+    precompute_all().
+    """
+    # Below this many messages sending the texts to other processes costs
+    # about as much as counting them, so they are counted on this process.
+    min_messages = 20000
+
+    def __init__(self, convo, processes=None, chunks_per_process=4, executor=None):
+        """
+        Args:
+            convo (MessengerConversation): The conversation to count
+            processes (int, optional): The number of worker processes.
+                Defaults to the number of cores. With 1, or if the
+                conversation has fewer than min_messages, everything is
+                counted on this process.
+            chunks_per_process (int, optional): Smaller chunks even out the
+                work between the processes. Defaults to 4.
+            executor (ProcessPoolExecutor, optional): A pool to use instead of
+                starting one. It isn't shut down here.
+        """
+        self.convo = convo
+        self.processes = processes or os.cpu_count() or 1
+        if len(convo.messages) < self.min_messages:
+            self.processes = 1
+        self.chunks_per_process = chunks_per_process
+        self._executor = executor
+        self._owns_executor = False
+        self._texts = None
+
+    def __enter__(self):
+        if self.processes > 1 and self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.processes)
+            self._owns_executor = True
+        return self
+
+    def __exit__(self, *exc_info):
+        if self._owns_executor:
+            self._executor.shutdown()
+            self._executor = None
+            self._owns_executor = False
+
+    def texts(self):
+        if self._texts is None:
+            self._texts = [message.get_text() for message in self.convo.messages]
+        return self._texts
+
+    def _map(self, function, columns, *constants):
+        """Runs function(chunk of each column..., *constants) for every chunk
+        and returns the results in order.
+        """
+        parts = max(1, min(self.processes * self.chunks_per_process, len(columns[0])))
+        chunks = list(zip(*(split(column, parts) for column in columns)))
+        if self.processes <= 1:
+            return [function(*chunk, *constants) for chunk in chunks]
+
+        executor = self._executor or ProcessPoolExecutor(max_workers=self.processes)
+        try:
+            futures = [executor.submit(function, *chunk, *constants) for chunk in chunks]
+            return [future.result() for future in futures]
+        finally:
+            if executor is not self._executor:
+                executor.shutdown()
+
+    def word_count(self):
+        """Same as MessengerConversation.get_word_count()
+        """
+        if self.processes <= 1:
+            # The conversation's own word lists are already made, or will be
+            # reused later
+            return self.convo.get_word_count()
+        return merge_counters(self._map(_count_words, [self.texts()]))
+
+    def sender_emoji_counts(self):
+        """Same as count_emojis_by_sender() over the whole conversation
+        """
+        columns = self.convo.get_columns()
+        partials = self._map(_count_emojis, [self.texts(), columns.sender_ids.tolist()], len(columns.senders))
+        return merge_sender_counts(partials)
+
+    def ngram_counts(self, n=2):
+        """Same as MessengerConversation.get_ngram_counts(n)
+        """
+        if self.processes <= 1:
+            return self.convo.get_ngram_counts(n)
+        return merge_counters(self._map(_count_ngrams, [self.texts()], n))
+
+    def precompute(self):
+        """Counts the words and emojis of the conversation and stores them in
+        it, so the graphs that use them don't have to count on the main process.
+        """
+        self.convo.set_counts(word_count=self.word_count(),
+                              sender_emoji_counts=self.sender_emoji_counts())
+
+
+def precompute_all(conversations, processes=None):
+    """Runs PartitionedAnalytics.precompute() for every conversation. One pool
+    of processes is shared between them and only started if a conversation is
+    big enough to need it.
+
+    Args:
+        conversations (list(MessengerConversation)): The conversations to count
+        processes (int, optional): The number of worker processes. Defaults to
+            the number of cores.
+    """
+    processes = processes or os.cpu_count() or 1
+    executor = None
+    try:
+        for convo in conversations:
+            if executor is None and processes > 1 and len(convo.messages) >= PartitionedAnalytics.min_messages:
+                executor = ProcessPoolExecutor(max_workers=processes)
+            PartitionedAnalytics(convo, processes, executor=executor).precompute()
+    finally:
+        if executor is not None:
+            executor.shutdown()
@@ -0,0 +1,391 @@
+import os
+import re
+import gc
+import time
+import pickle
+import hashlib
+from functools import partial
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+# Our imports
+from messenger import MessengerConversation, Message, JsonStreamReader, EncodingRepairError
+
+# Bump this whenever Message or MessengerConversation change what they store.
+# Cache entries written with a different version are ignored and re-parsed.
+CACHE_VERSION = 5
+
+# The folders of an export's messages folder that have conversations in them
+thread_folders = ("inbox", "archived_threads", "filtered_threads")
+
+
+class ConversationCache:
+    """Stores parsed message_N.json files on disk so the next start of the
+    program doesn't have to parse them again. Every json file gets its own
+    entry, keyed by the path, size and modified time of the file. Changing one
+    file only throws away the entry of that file.
+    
+    The entries are pickles. The key is pickled first, so a stale entry is
+    found without unpickling the conversation stored after it.
+    """
+    def __init__(self, folder="cache"):
+        """
+        Args:
+            folder (str, optional): Where to keep the cache files. Defaults to "cache".
+        """
+        self.folder = folder
+
+    def _entry_path(self, filename):
+        name = hashlib.sha1(os.path.abspath(filename).encode("utf-8")).hexdigest()
+        return os.path.join(self.folder, name + ".pickle")
+
+    def fingerprint(self, filename):
+        """Returns the key of a json file. It changes whenever the file does.
+        """
+        stat = os.stat(filename)
+        return (CACHE_VERSION, os.path.abspath(filename), stat.st_size, stat.st_mtime_ns)
+
+    def get(self, filename):
+        """Returns the cached MessengerConversation of a json file, or None
+        if the file has changed or was never cached.
+        """
+        try:
+            with open(self._entry_path(filename), "rb") as f:
+                if pickle.load(f) != self.fingerprint(filename):
+                    return None
+                return pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except (pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+            # A half written or outdated entry. It just gets parsed again.
+            return None
+
+    def put(self, filename, conversation):
+        """Stores the parsed MessengerConversation of a json file. The entry
+        is written to a temporary file first so a crash never leaves a broken
+        entry behind.
+        """
+        os.makedirs(self.folder, exist_ok=True)
+        entry_path = self._entry_path(filename)
+        temporary_path = "{}.{}.tmp".format(entry_path, os.getpid())
+        with open(temporary_path, "wb") as f:
+            pickle.dump(self.fingerprint(filename), f, protocol=pickle.HIGHEST_PROTOCOL)
+            pickle.dump(conversation, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temporary_path, entry_path)
+
+
+@contextmanager
+def paused_gc():
+    """Pauses the garbage collector. Parsing or unpickling a chat creates
+    millions of objects that all stay alive, and the collector would otherwise
+    keep scanning them over and over while they are being created.
+    """
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def find_message_files(folder):
+    """Returns the paths of the json files inside a conversation folder. The
+    message_N.json files are returned in order of N.
+
+    Args:
+        folder (str): The conversation folder. Eg, "assets/messages/inbox/MyChat_abc123"
+
+    Returns:
+        list(str): The json files to parse
+    """
+    def file_number(filename):
+        found = re.search(r"(\d+)\.json$", filename)
+        return (int(found.group(1)) if found else 0, filename)
+
+    filenames = [f for f in os.listdir(folder) if ".json" in f]
+    filenames.sort(key=file_number)
+    return [os.path.join(folder, f) for f in filenames]
+
+
+def load_message_file(filename, stream=False, repair_encoding=False):
+    """Parses a single message_N.json file. This is what the worker processes
+    run, so it has to stay a top level function for it to be pickled.
+    """
+    with paused_gc():
+        return MessengerConversation(filename=filename, stream=stream, repair_encoding=repair_encoding)
+
+
+def load_conversation(folder, processes=None, stream=False, cache=None, repair_encoding=False):
+    """Loads every message_N.json file in a conversation folder and combines
+    them into one MessengerConversation. The files are parsed on a pool of
+    processes so the load time scales with the number of cores. The parsed
+    files are then combined in one step so the messages are only sorted once.
+
+    Args:
+        folder (str): The conversation folder
+        processes (int, optional): The number of worker processes. Defaults
+            to the number of cores. Use 1 to parse the files one by one.
+        stream (bool, optional): Stream each file into Message objects
+            instead of decoding the whole file first. Uses less memory for
+            very large exports. Defaults to False.
+        cache (ConversationCache, optional): Files that haven't changed since
+            they were cached are read from here instead of being parsed. The
+            files that are parsed are added to it. Defaults to None.
+        repair_encoding (bool, optional): Fix Facebook's broken unicode for
+            the whole file at once instead of one field at a time. Files that
+            can't be repaired safely fall back to the per field conversion.
+            Defaults to False.
+
+    Returns:
+        MessengerConversation: The whole conversation
+    """
+    files = {folder: find_message_files(folder)}
+    for _, conversation, _ in _load_threads(files, processes, stream, cache, repair_encoding):
+        if isinstance(conversation, Exception):
+            raise conversation
+        return conversation
+
+
+def read_new_messages(filename, after_ms, repair_encoding=False):
+    """Reads the messages of a json file up to the first one sent before
+    after_ms. Facebook writes the newest messages first, so only the new part
+    of the file is read. The messages sent at after_ms itself are kept since
+    some of them might be new.
+
+    Args:
+        filename (str): A message_N.json file
+        after_ms (int): The timestamp_ms of the newest message already loaded
+        repair_encoding (bool, optional): See load_conversation(). Defaults to False.
+
+    Returns:
+        (list(Message), bool): The messages read, and whether the file ended
+        before an older message was found
+    """
+    with open(filename, "rb") as f, paused_gc():
+        try:
+            return _read_new_messages(f, after_ms, repair_encoding)
+        except EncodingRepairError:
+            f.seek(0)
+            return _read_new_messages(f, after_ms, False)
+
+
+def _read_new_messages(f, after_ms, repair_encoding):
+    messages = []
+    whole_file = True
+    reader = JsonStreamReader(f, repair_encoding=repair_encoding)
+    for key, value in reader.items(stream_key="messages"):
+        if key != "messages":
+            continue
+        if value["timestamp_ms"] < after_ms:
+            whole_file = False
+            break
+        messages.append(Message(value, repair_encoding))
+    if not repair_encoding:
+        Message.Content.normalize_all([m.content for m in messages if m.content is not None])
+    return messages, whole_file
+
+
+def ingest_conversation(conversation, folder, repair_encoding=False):
+    """Adds the messages from a newer export of a conversation to one that is
+    already loaded, eg from the cache. Only the messages newer than the
+    conversation's newest message are read, and messages that are already in
+    the conversation are skipped, so downloading a new export doesn't mean
+    parsing the whole chat again.
+
+    Args:
+        conversation (MessengerConversation): The loaded conversation. It is
+            changed in place.
+        folder (str): The conversation folder of the new export
+        repair_encoding (bool, optional): See load_conversation(). Defaults to False.
+
+    Returns:
+        int: The number of messages that were added
+    """
+    after_ms = conversation.messages[-1].timestamp_ms if conversation.messages else -1
+    messages = []
+    for filename in find_message_files(folder):
+        file_messages, whole_file = read_new_messages(filename, after_ms, repair_encoding)
+        messages += file_messages
+        if not whole_file:
+            # The older files only have older messages in them
+            break
+    return conversation.add_messages(messages)
+
+
+def find_threads(messages_folder="assets/messages"):
+    """Returns every conversation folder in a Facebook export. Looks inside
+    inbox, archived_threads and filtered_threads, skipping the ones that
+    aren't there.
+
+    Args:
+        messages_folder (str, optional): The messages folder of the export.
+            Defaults to "assets/messages".
+
+    Returns:
+        list(str): The conversation folders that have json files in them
+    """
+    threads = []
+    for inbox in thread_folders:
+        inbox_path = os.path.join(messages_folder, inbox)
+        if not os.path.isdir(inbox_path):
+            continue
+        for name in sorted(os.listdir(inbox_path)):
+            folder = os.path.join(inbox_path, name)
+            if os.path.isdir(folder) and any(".json" in f for f in os.listdir(folder)):
+                threads.append(folder)
+    return threads
+
+
+def load_inbox(messages_folder="assets/messages", processes=None, stream=False, cache=None,
+               repair_encoding=False, progress=True, errors=None):
+    """Loads every conversation in a Facebook export. The json files of all
+    the conversations share one pool of worker processes, so small chats are
+    parsed while the big ones are still going. A conversation that fails to
+    load is left out instead of stopping the rest, pass errors to find out
+    which ones did.
+
+    Args:
+        messages_folder (str, optional): The messages folder of the export.
+            Defaults to "assets/messages".
+        processes (int, optional): The number of worker processes. Defaults
+            to the number of cores.
+        stream (bool, optional): See load_conversation(). Defaults to False.
+        cache (ConversationCache, optional): See load_conversation(). Defaults to None.
+        repair_encoding (bool, optional): See load_conversation(). Defaults to False.
+        progress (bool, optional): Print a line as each conversation finishes
+            loading or fails. Defaults to True.
+        errors (dict, optional): The exception of every conversation that
+            failed to load is put in here by folder. Defaults to None.
+
+    Returns:
+        dict(str -> MessengerConversation): The conversations by folder, in
+        the order of find_threads()
+    """
+    start = time.perf_counter()
+    files = {folder: find_message_files(folder) for folder in find_threads(messages_folder)}
+    total_files = sum(len(filenames) for filenames in files.values())
+    if progress:
+        print("Loading {} conversations ({} files) from {}".format(len(files), total_files, messages_folder))
+
+    conversations = {}
+    loaded = _load_threads(files, processes, stream, cache, repair_encoding)
+    for done, (folder, conversation, seconds) in enumerate(loaded, 1):
+        name = os.path.basename(folder)
+        if isinstance(conversation, Exception):
+            if errors is not None:
+                errors[folder] = conversation
+            if progress:
+                print("[{}/{}] {}: failed to load: {!r}".format(done, len(files), name, conversation))
+            continue
+        conversations[folder] = conversation
+        if progress:
+            print("[{}/{}] {}: {} files, {:,} messages in {:.2f}s".format(
+                done, len(files), name, len(files[folder]), len(conversation.messages), seconds))
+
+    if progress:
+        print("Loaded {:,} messages in {:.2f}s".format(
+            sum(len(c.messages) for c in conversations.values()), time.perf_counter() - start))
+    return {folder: conversations[folder] for folder in files if folder in conversations}
+
+
+def _load_timed(filename, stream=False, repair_encoding=False):
+    """load_message_file() that also returns how many seconds it took
+    """
+    start = time.perf_counter()
+    conversation = load_message_file(filename, stream, repair_encoding)
+    return conversation, time.perf_counter() - start
+
+
+def _load_threads(files, processes, stream, cache, repair_encoding):
+    """Loads the json files of many conversations, yielding each conversation
+    as soon as all of its files are done. The largest files are handed out
+    first so one big file doesn't hold up the end of the pool.
+
+    Args:
+        files (dict(str -> list(str))): The json files of every conversation folder
+
+    Yields:
+        (str, MessengerConversation, float): The folder, its conversation and
+        the seconds spent loading its files. The conversation is the exception
+        instead if one of its files failed.
+    """
+    parsed = {}
+    seconds = {folder: 0.0 for folder in files}
+    folder_of = {}
+    for folder, filenames in files.items():
+        for filename in filenames:
+            folder_of[filename] = folder
+
+    if cache is not None:
+        with paused_gc():
+            for filename, folder in folder_of.items():
+                start = time.perf_counter()
+                cached = cache.get(filename)
+                seconds[folder] += time.perf_counter() - start
+                if cached is not None:
+                    parsed[filename] = cached
+    to_parse = [f for f in folder_of if f not in parsed]
+    to_parse.sort(key=os.path.getsize, reverse=True)
+
+    remaining = {folder: 0 for folder in files}
+    for filename in to_parse:
+        remaining[folder_of[filename]] += 1
+    failed = {}
+
+    def finish(filename, conversation, taken):
+        """Records a parsed file. Returns the folder if it was its last file.
+        """
+        folder = folder_of[filename]
+        seconds[folder] += taken
+        if isinstance(conversation, Exception):
+            failed.setdefault(folder, conversation)
+        else:
+            parsed[filename] = conversation
+            if cache is not None:
+                try:
+                    cache.put(filename, conversation)
+                except Exception as e:
+                    # The conversation is fine, it just gets parsed again next time
+                    print("Couldn't cache {}: {!r}".format(filename, e))
+        remaining[folder] -= 1
+        return folder if remaining[folder] == 0 else None
+
+    def combined(folder):
+        if folder in failed:
+            return folder, failed[folder], seconds[folder]
+        with paused_gc():
+            conversation = MessengerConversation.combine([parsed.pop(f) for f in files[folder]])
+        return folder, conversation, seconds[folder]
+
+    # Conversations that were completely cached are done already
+    for folder in files:
+        if remaining[folder] == 0:
+            yield combined(folder)
+
+    if processes is None:
+        processes = os.cpu_count() or 1
+    processes = min(processes, len(to_parse))
+
+    load_file = partial(_load_timed, stream=stream, repair_encoding=repair_encoding)
+    if processes <= 1:
+        for filename in to_parse:
+            try:
+                conversation, taken = load_file(filename)
+            except Exception as e:
+                conversation, taken = e, 0.0
+            folder = finish(filename, conversation, taken)
+            if folder is not None:
+                yield combined(folder)
+        return
+
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        futures = {executor.submit(load_file, filename): filename for filename in to_parse}
+        for future in as_completed(futures):
+            try:
+                conversation, taken = future.result()
+            except Exception as e:
+                conversation, taken = e, 0.0
+            folder = finish(futures[future], conversation, taken)
+            if folder is not None:
+                yield combined(folder)
@@ -1,7 +1,7 @@
 # Dash and Plotly
 from dash import Dash
 import dash
-from dash.dependencies import Input, Output, State, MATCH, ALL, ALLSMALLER
+from dash.dependencies import Input, Output, State, MATCH, ALL
 from dash.exceptions import PreventUpdate
 import dash_daq as daq
 import dash_html_components as html
@@ -11,7 +11,12 @@ import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 
 # Our imports
-from messenger import MessengerConversation
+from messenger import MessengerConversation, Message
+import messenger
+from collections import OrderedDict
+from concurrent.futures import Future
+import itertools
+import threading
 import os
 import json
 
@@ -32,28 +37,94 @@ log.once = False
 log()
 
 
-def convo_messages_to_html(convo):
+class MessagePages:
+    """The conversations being shown by convo_messages_to_html(). Only one
+    page of messages is sent to the browser at a time, so when the Previous or
+    Next button is pressed the rest of them are found in here. Only the most
+    recent conversations are kept. The server is threaded so it's locked.
+    """
+    def __init__(self, max_size=256):
+        """
+        Args:
+            max_size (int, optional): The most conversations to keep. Defaults
+                to 256.
+        """
+        self.max_size = max_size
+        self.pages = OrderedDict()  # {token: (convo, page_size)}
+        self.tokens = itertools.count()
+        self.lock = threading.Lock()
+
+    def add(self, convo, page_size):
+        """Returns the token used to find convo again.
+        """
+        with self.lock:
+            token = next(self.tokens)
+            self.pages[token] = (convo, page_size)
+            while len(self.pages) > self.max_size:
+                self.pages.popitem(last=False)
+            return token
+
+    def get(self, token):
+        """Returns (convo, page_size), or None if it isn't kept anymore.
+        """
+        with self.lock:
+            found = self.pages.get(token)
+            if found is not None:
+                self.pages.move_to_end(token)
+            return found
+
+
+message_pages = MessagePages()
+
+
+def convo_messages_to_html(convo, page_size=50):
     """Converts a conversation into a beautiful html representation of the
     messages. This function will break if the conversation has more than the
     numbers of colours in "colours". This uses a css file called "messages.css"
     that is automatically loaded by Dash because it's in the assets folder.
+
+    Only page_size messages are rendered at a time, with Previous and Next
+    buttons to see the others. Clicking a common word can find tens of
+    thousands of messages and sending all of them at once freezes the page.
+    The buttons are handled by Page.turn_message_page().
     
     See: 
         Colour - https://plotly.com/python/discrete-color/
         Messaging css - https://www.w3schools.com/howto/howto_css_chat.asp
+        Pattern matching - https://dash.plotly.com/pattern-matching-callbacks
 
     Args:
         convo (MessengerConversation): The messages to convert
+        page_size (int, optional): Messages to show at once. Defaults to 50.
 
     Returns:
-        <html>: The converted messages
+        <html>: The first page of messages and the buttons
+    """
+    assert page_size > 0
+    token = message_pages.add(convo, page_size)
+    return html.Div([
+        html.Div(id={"type": "messages", "index": token},
+                 children=message_page_to_html(convo, 0, page_size)),
+        html.Button("Previous", id={"type": "messages-previous", "index": token}, n_clicks=0),
+        html.Button("Next", id={"type": "messages-next", "index": token}, n_clicks=0),
+        # Where the page starts. It's the only thing that goes back and forth
+        # when a button is pressed.
+        dcc.Store(id={"type": "messages-cursor", "index": token}, data={"start": 0})
+    ])
+
+
+def message_page_to_html(convo, start, page_size):
+    """Returns the html of the page_size messages from start, and which ones
+    they are out of how many. See convo_messages_to_html().
     """
     # This doesn't work for large group chats cause colours will be out of range
     # We just loop around the colours and hope for the best.
     colours = px.colors.qualitative.Set3
 
-    output_html = []
-    for message in convo:
+    messages = convo[start:start + page_size]
+    output_html = [html.P("Messages {:,} to {:,} of {:,}".format(
+        min(start + 1, len(convo.messages)), start + len(messages), len(convo.messages)))]
+    for message in messages:
         colour = colours[convo.participants.index(message.sender) % len(colours)]
         output_html.append(
             html.Div([
@@ -62,15 +133,104 @@ def convo_messages_to_html(convo):
                 html.P(message.sender),
                 html.P(MediaMessage(message).html())
             ], className="chat_container", style={"background-color": colour}))
-    return html.Div(output_html)
+    return output_html
+
+
+class MediaFile:
+    """What MediaManifest knows about one photo, gif, audio clip or video.
+    """
+    __slots__ = ("path", "exists", "size", "thumbnail")
+
+    def __init__(self, path, exists, size=None, thumbnail=None):
+        """
+        Args:
+            path (str): Where the file is from here. Eg, "assets/messages/..."
+            exists (bool): If the file is actually there
+            size (int, optional): Bytes in the file. None if it doesn't exist.
+            thumbnail (str, optional): The path of a video's thumbnail. None if
+                it doesn't have one or it doesn't exist.
+        """
+        self.path = path
+        self.exists = exists
+        self.size = size
+        self.thumbnail = thumbnail
+
+
+class MediaManifest:
+    """Every media file of the conversations and whether it's in the assets
+    folder. Each folder of media is only read once, so rendering a day full
+    of photos doesn't go to the disk for each one. Use add_conversation() when
+    the conversations are loaded. Media that wasn't added is added the first
+    time it's rendered. The server is threaded so it's locked.
+    """
+    def __init__(self, assets_folder="assets/"):
+        self.assets_folder = assets_folder
+        self.files = {}  # {uri: MediaFile}
+        self.folders = {}  # {folder: {file name: size}}
+        self.lock = threading.Lock()
+
+    def add_conversation(self, convo):
+        """Finds the files of every photo, gif, audio clip and video in convo.
+        """
+        for message in convo.messages:
+            for media in itertools.chain(message.photos, message.gifs, message.audio, message.videos):
+                self.get(media)
+
+    def get(self, media):
+        """Returns the MediaFile of a Message.Photo, Gif, Audio or Video.
+        """
+        found = self.files.get(media.uri)
+        if found is not None:
+            return found
+        with self.lock:
+            found = self._find(media.uri)
+            if isinstance(media, Message.Video):
+                thumbnail = self._find(media.thumbnail)
+                if thumbnail.exists:
+                    found.thumbnail = thumbnail.path
+            self.files[media.uri] = found
+            return found
+
+    def _find(self, uri):
+        folder, name = os.path.split(uri)
+        if folder not in self.folders:
+            self.folders[folder] = self._read_folder(folder)
+        path = "{}{}".format(self.assets_folder, uri)
+        size = self.folders[folder].get(name)
+        return MediaFile(path, size is not None, size)
+
+    def _read_folder(self, folder):
+        """Returns {file name: size} for every file in the folder.
+        """
+        sizes = {}
+        try:
+            with os.scandir(os.path.join(self.assets_folder, folder)) as entries:
+                for entry in entries:
+                    if entry.is_file():
+                        sizes[entry.name] = entry.stat().st_size
+        except (FileNotFoundError, NotADirectoryError):
+            pass
+        return sizes
+
+    def missing(self):
+        """Returns the uris of the files that couldn't be found
+        """
+        return [uri for uri, found in self.files.items() if not found.exists]
+
+    def __repr__(self):
+        found = [f for f in self.files.values() if f.exists]
+        return "MediaManifest<{} files, {} missing, {:.1f} MB>".format(
+            len(found), len(self.files) - len(found), sum(f.size for f in found) / 2**20)
+
+
+media_manifest = MediaManifest()
 
 
 class MediaMessage:
-    """Specifically used to render Messages with content.
+    """Specifically used to render Messages with content. The files come from
+    media_manifest.
     """
     def __init__(self, message):
-        self.assets_folder = "assets/"
-        
         self.gifs = self._find_gifs(message.gifs)
         self.audio = self._find_audio(message.audio)
         self.videos = self._find_videos(message.videos)
@@ -80,12 +240,13 @@ class MediaMessage:
     def _find_videos(self, videos):
         video_html = []
         for video in videos:
-            uri = self._find_uri(video.uri)
+            found = media_manifest.get(video)
             
-            if uri is not None:
+            if found.exists:
                 video_html.append(
                     html.Video(
-                        src=uri,
+                        src=found.path,
+                        poster=found.thumbnail,
                         controls=True
                     )
                 )
@@ -94,12 +255,12 @@ class MediaMessage:
     def _find_photos(self, photos):
         photo_html = []
         for photo in photos:
-            uri = self._find_uri(photo.uri)
+            found = media_manifest.get(photo)
             
-            if uri is not None:
+            if found.exists:
                 photo_html.append(
                     html.Img(
-                        src=uri
+                        src=found.path
                     )
                 )
         return html.Div(photo_html)
@@ -110,24 +271,17 @@ class MediaMessage:
     def _find_audio(self, audio):
         audio_html = []
         for clip in audio:
-            uri = self._find_uri(clip.uri)
+            found = media_manifest.get(clip)
             
-            if uri is not None:
+            if found.exists:
                 audio_html.append(
                     html.Audio(
-                        src=uri,
+                        src=found.path,
                         controls=True
                     )
                 )
         return html.Div(audio_html)
     
-    def _find_uri(self, uri):
-        uri = "{}{}".format(self.assets_folder, uri)
-        if not os.path.exists(uri):
-            print("Error: Could not find: {}".format(uri))
-            return None
-        return uri
-    
     def html(self):
         return html.Div([
             dcc.Markdown(self.text),
@@ -138,6 +292,98 @@ class MediaMessage:
         ])
 
 
+class FigureCache:
+    """The figures the Graphs have already made. Every button press re-renders
+    every graph on the page, but most of them look exactly the same as last
+    time, so they are reused from here. Only the most recently used figures
+    are kept.
+
+    The figures are stored as plain dicts and graphs with the same key share
+    them. See Graph.graph_function(). The server is threaded so it's locked.
+
+    The Futures of Page.warm_up() are kept apart in self.warming until their
+    figure is first used. If they went in the LRU, a page with more graphs
+    than max_size would evict them all before the first request read them.
+    """
+    def __init__(self, max_size=64):
+        """
+        Args:
+            max_size (int, optional): The most figures to keep. Defaults to 64.
+        """
+        self.max_size = max_size
+        self.figures = OrderedDict()
+        self.warming = {}  # {key: Future}
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.figures)
+
+    def key(self, graph):
+        """Returns what makes a figure look the way it does. The conversation
+        itself is part of the key so it can't be garbage collected and have
+        its id reused by another one. Its length is there in case messages are
+        added to it.
+
+        Returns:
+            tuple: The key, or None if a switch value can't be made into one.
+                Those figures aren't cached.
+        """
+        convo = graph.convo
+        try:
+            return (graph.figure_function, convo, len(convo.messages),
+                    messenger.timezone_name, graph.graph_switch_group.values())
+        except TypeError:
+            return None
+
+    def get(self, key):
+        """Returns the cached figure, a Future of it if it's being warmed up,
+        or None if it hasn't been made yet.
+        """
+        with self.lock:
+            figure = self.figures.get(key)
+            if figure is None:
+                if key in self.warming:
+                    self.hits += 1
+                    return self.warming[key]
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.figures.move_to_end(key)
+            return figure
+
+    def put(self, key, figure):
+        with self.lock:
+            self.warming.pop(key, None)
+            self.figures[key] = figure
+            self.figures.move_to_end(key)
+            while len(self.figures) > self.max_size:
+                self.figures.popitem(last=False)
+                self.evictions += 1
+
+    def put_warming(self, key, future):
+        """Stores a Future of a figure that Page.warm_up() is making. It stays
+        out of the LRU until put() is called with the figure.
+        """
+        with self.lock:
+            self.warming[key] = future
+
+    def clear(self):
+        with self.lock:
+            self.figures.clear()
+            self.warming.clear()
+
+    def hit_rate(self):
+        calls = self.hits + self.misses
+        return self.hits / calls if calls else 0.0
+
+    def __repr__(self):
+        return "FigureCache<{}/{}>(hits={}, misses={}, evictions={}, hit rate={:.0%})".format(
+            len(self.figures), self.max_size, self.hits, self.misses, self.evictions, self.hit_rate())
+
+
 class Page:
     """This represents Page of graphs. This class handles the initiation
     of the data inside Graph and the initialisation of the web
@@ -148,11 +394,20 @@ class Page:
     
     This takes in a dash.Dash.app.
     """
-    def __init__(self, app):
+    # The properties a GraphSwitch can want
+    button_types = ["on", "n_clicks", "value"]  # TODO Add More
+
+    def __init__(self, app, figure_cache_size=64):
         assert type(app) == Dash
         self.app = app
         # self.graphs = []
         self.graphes_index_dict = {}  # {index: graph}
+        # Figures shared by every graph on this page. See FigureCache
+        self.figure_cache = FigureCache(figure_cache_size)
+        # The graphs added by each graph's on_click and on_select. See
+        # call_adding_graphs()
+        self.made_by = {}  # {(graph index, "on-click"): [graph indexes]}
+        self.adding = threading.local()
 
     def run(self):
         """Runs the webserver. It registers the generic callback functions. 
@@ -177,222 +432,220 @@ class Page:
         # On click
         self.app.callback(
             Output({"type": "on-click", "index": MATCH}, "children"),
-            [Input({"type": "figure", "index": MATCH}, "clickData")],
-            [State({"type": "figure", "index": MATCH}, "figure")]
+            [Input({"type": "figure", "index": MATCH}, "clickData")]
         )(self.on_click)
 
         # On Select
         self.app.callback(
             Output({"type": "on-select", "index": MATCH}, "children"),
-            [Input({"type": "figure", "index": MATCH}, "selectedData")],
-            [State({"type": "figure", "index": MATCH}, "figure")]
+            [Input({"type": "figure", "index": MATCH}, "selectedData")]
         )(self.on_select)
 
-        # On Button Press
-        self.button_types = ["on", "n_clicks", "value"]  # TODO Add More
-        inputs = [Input({"type": "button", "index": ALL}, bt)
+        # Previous and Next buttons below messages. See convo_messages_to_html
+        self.app.callback(
+            [Output({"type": "messages", "index": MATCH}, "children"),
+             Output({"type": "messages-cursor", "index": MATCH}, "data")],
+            [Input({"type": "messages-previous", "index": MATCH}, "n_clicks"),
+             Input({"type": "messages-next", "index": MATCH}, "n_clicks")],
+            [State({"type": "messages-cursor", "index": MATCH}, "data")],
+            prevent_initial_call=True
+        )(self.turn_message_page)
+
+        # On Button Press. MATCH is the graph and ALL is every switch of that
+        # graph, so only the switches of the graph that changed are sent. The
+        # "wants" in the id means each Input only gets the switches that have
+        # that property. See GraphSwitch.create()
+        inputs = [Input({"type": "button", "index": MATCH, "wants": bt, "name": ALL}, bt)
                   for bt in self.button_types]
         self.app.callback(
             Output({"type": "graph", "index": MATCH}, "children"),
             inputs,
-            [State({"type": "figure", "index": ALLSMALLER}, "figure"),
-             State({"type": "figure", "index": ALL}, "figure")]
+            prevent_initial_call=True
         )(self.update_graph)
 
+        # With debug on, Dash starts a second copy of this program that does
+        # the serving (and restarts when a file changes). The first copy only
+        # watches the files so it doesn't need any figures.
+        if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+            self.warm_up()
+
         self.app.run_server(debug=True, threaded=True)
 
-    def get_graph_index_from_figure(self, figure):
-        """I embed the graph index into the uid of the graph when its created.
-        This hack lets me remember which graph a figure is when it returned 
-        from the callback functions.
+    def warm_up(self):
+        """Starts making the figure of every graph on a background thread and
+        returns straight away. get_page() is called by the first request and
+        would otherwise make them all one after another. The thread puts a
+        Future of every figure in the figure cache first, so a request only
+        waits for the figures that aren't done yet. See
+        FigureCache.put_warming().
+
+        The figures are made one at a time. They are pure Python, so more
+        threads wouldn't make them any faster. This only moves the work to
+        while the server is starting. A request can still work out the same
+        columns or aggregates as the thread at the same time, it just wastes
+        a bit of time.
+        """
+        graphs = list(self.graphes_index_dict.values())
+        threading.Thread(target=self._warm_up, args=(graphs,), daemon=True).start()
 
-        Args:
-            figure (dict): The callback json of a figure
+    def _warm_up(self, graphs):
+        """The background thread of warm_up(). The keys are worked out here
+        too, so none of the work happens before the server starts.
+        """
+        warming = []
+        for graph in graphs:
+            key = self.figure_cache.key(graph)
+            if key is None:
+                continue
+            future = Future()
+            self.figure_cache.put_warming(key, future)
+            warming.append((graph, future))
+
+        for graph, future in warming:
+            try:
+                future.set_result(graph.make_figure())
+            except Exception as e:
+                # Made again by the request so the error shows up there
+                future.set_exception(e)
+
+    def get_callback_graph(self):
+        """Returns the graph whose callback is running. Every graph callback has
+        one output with the graph index in its id, so it's found from there.
+
+        Raises:
+            PreventUpdate: If the graph has been deleted. This happens when the
+                graph that made it was clicked again, but the old html was
+                still there for a moment.
 
         Returns:
-            int: The graph index
+            Graph: The graph
         """
-        return int(figure["data"][0]["uid"])
-    
-    def on_click(self, click_data, figure):
+        output = dash.callback_context.outputs_list
+        try:
+            return self.graphes_index_dict[output["id"]["index"]]
+        except KeyError:
+            raise PreventUpdate
+
+    def on_click(self, click_data):
         """This function is called when a graph is clicked. It returns the html
         that will be sloted into the 'on-click' id of the graph in question.
+        The graphs the last click made are gone from the page now, so they are
+        deleted first.
 
         Args:
             click_data (dict): Corresponding data about the click
-            figure (dict): Dict containing data about the relevant figure
 
         Returns:
             <html>: What to render now that the figure has been clicked
         """
-        graph_index = self.get_graph_index_from_figure(figure)
-        graph = self.graphes_index_dict[graph_index]
-        # log("Page.on_click() triggered for", graph_index)
-        return graph.on_click(click_data)
+        graph = self.get_callback_graph()
+        # log("Page.on_click() triggered for", graph.index)
+        return self.call_adding_graphs(graph, "on-click", graph.on_click, click_data)
 
-    def on_select(self, select_data, figure):
+    def on_select(self, select_data):
         """This function is called when elements in the graph are selected. It
         returns the html that will be sloted into the 'on-select' id of the
         graph in question.
 
         Args:
             select_data (dict): Corresponding data about the selection
-            figure (dict): Dict containing data about the relevant figure
 
         Returns:
             <html>: What to render now that data has been selected
         """
-        graph_index = self.get_graph_index_from_figure(figure)
-        graph = self.graphes_index_dict[graph_index]
-        # log("Page.on_select() triggered for", graph_index)
-        return graph.on_select(select_data)
+        graph = self.get_callback_graph()
+        # log("Page.on_select() triggered for", graph.index)
+        return self.call_adding_graphs(graph, "on-select", graph.on_select, select_data)
 
-    def update_graph(self, *graph_changes):
-        """This is some of the most retarded hacky code I've ever written. The
-        Dash api is complete garbage but I've managed to find way of working
-        around every single thing that has blocked me so far.
+    def call_adding_graphs(self, graph, kind, function, data):
+        """Calls function(data) and remembers the graphs it adds to the page,
+        so they can be deleted when their html is replaced. The graphs it
+        added last time are deleted first.
 
         Args:
-            *graph_changes. Due to the nature of the callbacks, this comes in
-                three parts.
-                1. All the button inputs. This will make up the majority of this
-                list.
-                2. All the figures in the graph that have a smaller index than
-                the one that got triggered. This is used to identify which
-                graph was clicked because apparently you can't use MATCH and ALL
-                at the same time when you create the callbacks. This is so dumb,
-                because you can use ALLSMALLER and ALL but not the other one.
-                It's whatever
-                3. A list of all the figures. This is used to find out which
-                graphs we need to delete from the graph dictionary -> the ones
-                which aren't on the screen anymore.
+            graph (Graph): The graph whose callback this is
+            kind (str): "on-click" or "on-select"
+            function (<function>): The callback of the graph
+            data (dict): What to pass to function
+
+        Returns:
+            What function returns
+        """
+        self.delete_graphs_made_by((graph.index, kind))
+        self.adding.made_by = (graph.index, kind)
+        try:
+            return function(data)
+        finally:
+            self.adding.made_by = None
+
+    def delete_graphs_made_by(self, made_by):
+        """Deletes the graphs that a callback added, and the ones they added.
+
+        Args:
+            made_by (tuple): (graph index, "on-click" or "on-select")
+        """
+        for index in self.made_by.pop(made_by, []):
+            self.delete_graphs_made_by((index, "on-click"))
+            self.delete_graphs_made_by((index, "on-select"))
+            if index in self.graphes_index_dict:
+                self.delete_graph(index)
+
+    def turn_message_page(self, previous_clicks, next_clicks, cursor):
+        """This function is called when the Previous or Next button under some
+        messages is pressed. Only the start of the page is sent back and forth,
+        the messages themselves are kept in message_pages.
+
+        Args:
+            previous_clicks (int): Times Previous was pressed. Unused
+            next_clicks (int): Times Next was pressed. Unused
+            cursor (dict): {"start": where the page shown starts}
 
         Raises:
-            PreventUpdate: This is raised if a KeyError is raised when accessing
-                the graph dictionary. Why this happens is still unknown to me
-                and it annoys the hell out of me. But it never seemed to cause
-                an issue with the graph. I have a feeling the callback functions
-                are firing twice, and the second time hasn't registered the
-                deletion of the graph the first time.
+            PreventUpdate: If there is nothing before or after this page
 
         Returns:
-            <html>: The updated graph
+            (<html>, dict): The new page of messages and its cursor
         """
-        
-        # Get each of the three components
-        # log("Graph Change", json.dumps(graph_changes, indent=2))
-        button_changes = graph_changes[:-2]
-        smaller_figures = graph_changes[-2]
-        all_figures = graph_changes[-1]
-
-        # Get the graph indices that ARE being shown on the screen. It's
-        # sorted so that the buttons line up with the graphs. This feels like
-        # a gross workaround cause it is.
-        applied_graph_indexes = []
-        for figure in all_figures:
-            applied_graph_indexes.append(
-                self.get_graph_index_from_figure(figure))
-        applied_graph_indexes.sort()
-
-        # Get the graph indices that are LESS THAN the figure that called this
-        # function. Sorting reason is above, but also kinda scared to not sort
-        # at this point.
-        smaller_figures_indexes = []
-        for figure in smaller_figures:
-            smaller_figures_indexes.append(
-                self.get_graph_index_from_figure(figure))
-        smaller_figures_indexes.sort()
-
-        # log("Page.update_graph() smaller figures", smaller_figures_indexes)
-
-        # Now work out the graph indices that aren't being shown and store them
-        # in a list to be deleted.
-        # log("Page.update_graph() showing", applied_graph_indexes)
-        need_to_delete = []
-        for index in self.graphes_index_dict.keys():
-            if index not in applied_graph_indexes:
-                need_to_delete.append(index)
-        # log("Page.update_graph() deleting", need_to_delete)
-
-        
-        # The graph index is the length of the graphs with a smaller index. This
-        # doesn't feel like it should work but it does. I need to watch this
-        # because larger pages might expose why this doesn't work.
-        graph_index = len(smaller_figures)
-        # log("Page.update_graph() triggered for", graph_index)
-        
-        # Deleting the graphs
-        # log("Page.update_graph() Before delete", self)
-        for index in need_to_delete:
-            self.delete_graph(index)
-        # log("Page.update_graph() After delete", self)
-
-        # Need to find the exact graph index that we clicked on
-        # Sometimes raises a key error. This is bugging me so much but it seems
-        # to be ignorable. I have a feeling it's calling this function twice or
-        # something. IT ANNOYS ME THAT I CAN'T FIND THE ROOT OF THE PROBLEM.
-        try:
-            graph = self.graphes_index_dict[graph_index]
-        except KeyError:
+        triggered = dash.callback_context.triggered
+        if not triggered or triggered[0]["value"] is None:
             raise PreventUpdate
-        
-        # Now we update all the buttons values using the button changes
-        # section
-        self.update_all_graph_buttons(applied_graph_indexes, *button_changes)
-
-        # Then we call the graph to be re-rendered and the html returned.
-        return graph.update_graph()
+        # The prop_id looks like '{"index":3,"type":"messages-next"}.n_clicks'
+        button = json.loads(triggered[0]["prop_id"].rsplit(".", 1)[0])
+
+        found = message_pages.get(button["index"])
+        if found is None:
+            return [html.P("These messages are too old. Click the graph again to see them.")], cursor
+        convo, page_size = found
+
+        start = cursor["start"]
+        if button["type"] == "messages-next":
+            start += page_size
+        else:
+            start -= page_size
+        if start < 0 or start >= len(convo.messages):
+            raise PreventUpdate
+        return message_page_to_html(convo, start, page_size), {"start": start}
 
-    def update_all_graph_buttons(self, applied_graph_indexes, *values):
-        """This function also works by some magic and gross workarounds. The
-        values that are passed in are the buttons that are only on the screen.
-        Because of this, we also need to know which graphs are also on the screen.
-        This is supplied through applied_graph_indexes. The values is also dumb
-        too. For all the different kinds of the button inputs, eg. n_clicks, on
-        etc. It provides a list of values. This list is the length of the number
-        buttons on the screen despite them not aligning with that type most of the
-        time. Values of None in the list mean that the button type does not apply
-        to this button. By looping through each of the buttons and finding the
-        "wants" that corresponds to the index in the value that isn't None, we
-        can update all the values of the buttons.
+    def update_graph(self, *values):
+        """This function is called when a switch of a graph changes. Only that
+        graph's switches are sent, one list for each of the button types. The
+        ids in callback_context.inputs_list line up with the values and have
+        the switch name in them.
 
         Args:
-            applied_graph_indexes (list): Graph indices that are active
-            *values (list): list of button types and their mapping to each
-                button.
-        """
-        assert len(values) == len(self.button_types)
-
-        # log("Page.update_all_graph_buttons()", applied_graph_indexes)
-
-        # First we grab all the switches and store them in a list. If we change
-        # them here, we also change them in the Graphs since they are references.
-        # Awesome!
-        all_graph_switches = []
-        for graph_index in applied_graph_indexes:
-            graph = self.graphes_index_dict[graph_index]
-            all_graph_switches += graph.graph_switches
-
-        # log()
-        # log("Before")
-        # log("\n".join(list(map(str, all_graph_switches))))
-
-        # This is the magic that maps. Don't ask. It was 2am:
-        # [n_clicks, on, value, blah]
-        # [None, 0, None], [True, None, None], [None, None, 5], [None, None, None]
-        # [b1, b2, b3]
-        for i, value_list in enumerate(values):
-            assert len(value_list) == len(all_graph_switches), "Expected {}. Got {}".format(
-                len(value_list), len(all_graph_switches))
-            # value_list = [None, 0, None]
-            wants = self.button_types[i]
-
-            for switch_idx, graph_switch in enumerate(all_graph_switches):
-                if wants == graph_switch.wants and value_list[switch_idx] is not None:
-                    graph_switch.set_value(value_list[switch_idx])
-        # log("After")
-        # log("\n".join(list(map(str, all_graph_switches))))
-        # log()
+            *values (list): For each button type, the values of the graph's
+                switches that have that type
+
+        Returns:
+            <html>: The updated graph
+        """
+        graph = self.get_callback_graph()
+        # log("Page.update_graph() triggered for", graph.index)
+        for switch_inputs, value_list in zip(dash.callback_context.inputs_list, values):
+            for switch_input, value in zip(switch_inputs, value_list):
+                if value is not None:
+                    graph.graph_switch_group.set(switch_input["id"]["name"], value)
+        return graph.update_graph()
 
     def add_graph(self, graph):
         """Finds the first valid index and then gives that value to the graph
@@ -409,6 +662,9 @@ class Page:
         # log("Page.add_graph() found index", index)
 
         self.graphes_index_dict[index] = graph
+        made_by = getattr(self.adding, "made_by", None)
+        if made_by is not None:
+            self.made_by.setdefault(made_by, []).append(index)
         graph.create(self, index)
     
     def add_graphs(self, graph_list):
@@ -444,6 +700,10 @@ class Page:
         Returns:
             <html>: The html to serve on this webpage.
         """
+        # The graphs that were made by clicking are gone once the page reloads
+        for made_by in list(self.made_by.keys()):
+            self.delete_graphs_made_by(made_by)
+
         # I just serve all the html for every graph.
         return html.Div([graph.html() for graph in list(self.graphes_index_dict.values())])
 
@@ -500,7 +760,10 @@ class Graph:
         self.index = index
 
         for graph_switch in self.graph_switches:
+            assert graph_switch.wants in page.button_types, "{} isn't in Page.button_types".format(graph_switch)
             graph_switch.create(self.index)
+        names = [graph_switch.name for graph_switch in self.graph_switches]
+        assert len(set(names)) == len(names), "Two switches of {} have the same name".format(self)
 
         self.graph_switch_group = GraphSwitchGroup(self.graph_switches)
 
@@ -545,22 +808,44 @@ class Graph:
 
     def graph_function(self):
         """Returns the html for the graph with its index. Passes the graph
-        switch group to the figure_function.
+        switch group to the figure_function. If the figure has been made before
+        with the same conversation and switch values it comes from the page's
+        FigureCache instead.
 
         Returns:
             <html>: The graph html
         """
-        figure = self.figure_function(self, self.graph_switch_group)
+        figure_cache = self.page.figure_cache
+        key = figure_cache.key(self)
+        if key is None:
+            return dcc.Graph(
+                figure=self.make_figure(),
+                id={"type": "figure", "index": self.index}
+            )
+        figure = figure_cache.get(key)
+        if isinstance(figure, Future):
+            # Page.warm_up() is still making it, or it broke in there. If it
+            # broke, it gets made again here so the error shows up properly.
+            # Either way it goes in the LRU now that it's being used.
+            figure = figure.result() if figure.exception() is None else None
+            if figure is not None:
+                figure_cache.put(key, figure)
+        if figure is None:
+            figure = self.make_figure()
+            figure_cache.put(key, figure)
+            log("Graph.graph_function() made a figure for", self, figure_cache)
         
-        # This is where we store/hide the graph_index in the figure. Very hacky
-        # but it works.
-        figure.update_traces(uid=self.index)
-
         return dcc.Graph(
             figure=figure,
             id={"type": "figure", "index": self.index}
         )
 
+    def make_figure(self):
+        """Calls the figure_function and returns the figure as a dict, which
+        is how the FigureCache stores it.
+        """
+        return self.figure_function(self, self.graph_switch_group).to_plotly_json()
+
     def html(self):
         """Returns the complete html representation of this graph. This is
         unique because it used the graph index with "Pattern Matching Callbacks".
@@ -642,8 +927,10 @@ class GraphSwitch:
         """
         assert graph_index >= 0
         self.graph_index = graph_index
+        # The name and wants are in the id so Page.update_graph() knows which
+        # switch a value is for
         self.button = self.switch(
-            id={"type": "button", "index": self.graph_index},
+            id={"type": "button", "index": self.graph_index, "wants": self.wants, "name": self.name},
             **self.switch_kwargs
         )
         # log("GraphSwitch.create()", self)
@@ -681,6 +968,17 @@ class GraphSwitchGroup:
             assert type(graph_switch) == GraphSwitch
 
         self.graph_switch_dict = {gs.name: gs for gs in graph_switches}
+
+    def values(self):
+        """Returns the name and value of every switch as a JSON string, so it
+        can be used as a key even when a value is a list. A switch that doesn't
+        have its value set yet is None. See FigureCache.
+
+        Raises:
+            TypeError: If a value can't be turned into JSON
+        """
+        return json.dumps({name: gs.switch_kwargs.get(gs.wants)
+                           for name, gs in self.graph_switch_dict.items()}, sort_keys=True)
         
     def __repr__(self):
         """A string representation of a GraphSwitchGroup
@@ -706,6 +1004,16 @@ class GraphSwitchGroup:
             return fb
         return self.graph_switch_dict[graph_switch_name].get_value()
 
+    def set(self, graph_switch_name, value):
+        """Sets the value of a button in this ButtonGroup. Used by Page when
+        a switch changes.
+
+        Args:
+            graph_switch_name (str): The GraphSwitch.name
+            value (<any>): The new value
+        """
+        self.graph_switch_dict[graph_switch_name].set_value(value)
+
 
 def main():
     pass
@@ -1,8 +1,10 @@
 import dash_core_components as dcc
 import dash_daq as daq
 from dash import Dash
-from messenger import MessengerConversation
-from messenger_stats import Page, Graph, GraphSwitch
+from messenger import set_timezone
+from messenger_stats import Page, Graph, GraphSwitch, media_manifest
+import messenger_ingest
+from messenger_analytics import precompute_all
 from external_graphs import *
 import sys, os
 
@@ -19,12 +21,15 @@ def load_to_graph():
 
 
 def load_conversation(name, path="assets/messages/inbox/"):
-    convo = MessengerConversation()
-    for found_file in os.listdir(path + name):
-        if ".json" not in found_file:
-            continue
-        convo += MessengerConversation(filename=path + name + "/" + found_file)
-    return convo
+    # Parsed files are kept in cache/ so the next start is much faster
+    cache = messenger_ingest.ConversationCache()
+    return messenger_ingest.load_conversation(path + name, cache=cache)
+
+
+def load_everything(path="assets/messages"):
+    # Every conversation in inbox, archived_threads and filtered_threads
+    cache = messenger_ingest.ConversationCache()
+    return list(messenger_ingest.load_inbox(path, cache=cache).values())
 
 
 def main():
@@ -59,12 +64,28 @@ def main():
     # For most_common_emojis
     emoji_count = GraphSwitch(daq.NumericInput, "emoji_count", "value", value=10, min=1, max=9999, label="Emojis to show")
 
+    """Choose the timezone"""
+    # The times are shown in the timezone of this computer unless
+    # MESSENGER_TIMEZONE is set. Eg, MESSENGER_TIMEZONE=Australia/Sydney
+    set_timezone(os.environ.get("MESSENGER_TIMEZONE"))
+
     """Create conversations"""
     # Use the to_graph.txt
     conversations = load_to_graph()
     # OR load directly here
     # conversations.append(load_conversation("MyChat_abc123abc123"))
+    # OR load every conversation in your export (makes a lot of graphs)
+    # conversations = load_everything()
     print(conversations)
+
+    # Count the words and emojis now, on every core for the big chats,
+    # instead of when the graphs first need them
+    precompute_all(conversations)
+
+    # Find the photos, videos etc. now instead of every time they are shown
+    for convo in conversations:
+        media_manifest.add_conversation(convo)
+    print(media_manifest)
     
     """Create graphs"""
     graphs = []
@@ -75,7 +96,7 @@ def main():
             Graph(convo, hourly_messages,       on_click=hourly_messages_on_click,      buttons=[clear_button]),
             Graph(convo, get_any_message,       on_click=get_any_message_on_click,      buttons=[clear_button, year, month, day, hour, minute, second]),
             Graph(convo, most_common_words,     on_click=most_common_words_on_click,    buttons=[clear_button, top_words, word_longer_than, word_match]),
-            # Graph(convo, most_common_emojis,    on_click=most_common_emojis_on_click,   buttons=[clear_button, emoji_count]) # Slow
+            Graph(convo, most_common_emojis,    on_click=most_common_emojis_on_click,   buttons=[clear_button, emoji_count]),
         ]
 
     page.add_graphs(graphs)